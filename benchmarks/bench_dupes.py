@@ -0,0 +1,82 @@
+"""Benchmarks the near-duplicate search in Pipeline._filter_dupes against the brute-force pairwise scan.
+
+Run from the repository root:
+    python benchmarks/bench_dupes.py
+"""
+import itertools
+from pathlib import Path
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import HammingIndex, hamming_pairs_matrix
+
+SIZES = [1000, 2000, 4000, 8000, 16000]
+TOLERANCE = 5
+SWEEP_SIZE = 20000
+HASH_BITS = 64
+
+def make_hashes(n: int, seed: int=0) -> list[int]:
+    """Random 64-bit hashes where roughly one in five is a planted near-duplicate of an earlier hash."""
+    rng = random.Random(seed)
+    hashes = []
+    for _ in range(n):
+        if hashes and rng.random() < 0.2:
+            hash_value = rng.choice(hashes)
+            for bit in rng.sample(range(HASH_BITS), rng.randint(0, TOLERANCE + 2)):
+                hash_value ^= 1 << bit
+        else:
+            hash_value = rng.getrandbits(HASH_BITS)
+        hashes.append(hash_value)
+    return hashes
+
+def brute_pairs(hashes: list[int], radius: int) -> set[tuple[int, int]]:
+    return {
+        (i, j) for (i, a), (j, b) in itertools.combinations(enumerate(hashes), 2)
+        if (a ^ b).bit_count() <= radius
+    }
+
+def index_pairs(hashes: list[int], radius: int) -> set[tuple[int, int]]:
+    pairs = set()
+    index = HammingIndex(radius, expected_size=len(hashes))
+    for j, hash_value in enumerate(hashes):
+        for i, _ in index.query(hash_value):
+            pairs.add((i, j))
+        index.add(hash_value, j)
+    return pairs
+
+def matrix_pairs(hashes: list[int], radius: int) -> set[tuple[int, int]]:
+    pairs = set()
+    for i, j in hamming_pairs_matrix(np.array(hashes, dtype=np.uint64), radius):
+        pairs.update(zip(i.tolist(), j.tolist()))
+    return pairs
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    print(f"{'n':>7} {'brute (s)':>10} {'index (s)':>10} {'matrix (s)':>11} {'pairs':>7}")
+    for n in SIZES:
+        hashes = make_hashes(n)
+        expected, brute_time = timed(brute_pairs, hashes, TOLERANCE)
+        found, index_time = timed(index_pairs, hashes, TOLERANCE)
+        assert found == expected, f"HammingIndex disagrees with brute force at n={n}"
+        found, matrix_time = timed(matrix_pairs, hashes, TOLERANCE)
+        assert found == expected, f"hamming_pairs_matrix disagrees with brute force at n={n}"
+        print(f"{n:>7} {brute_time:>10.3f} {index_time:>10.3f} {matrix_time:>11.3f} {len(found):>7}")
+
+    # Tolerance sweep at a fixed size, the case the GUI slider exercises
+    n = SWEEP_SIZE
+    hashes = make_hashes(n)
+    print(f"\nTolerance sweep, n={n}")
+    print(f"{'radius':>7} {'index (s)':>10} {'matrix (s)':>11} {'pairs':>7}")
+    for radius in range(0, 11):
+        found, index_time = timed(index_pairs, hashes, radius)
+        expected, matrix_time = timed(matrix_pairs, hashes, radius)
+        assert found == expected, f"Search paths disagree at radius={radius}"
+        print(f"{radius:>7} {index_time:>10.3f} {matrix_time:>11.3f} {len(found):>7}")
@@ -0,0 +1,87 @@
+"""Measures encode time against output size for every output format and encoder profile.
+
+Run from the repository root:
+    python benchmarks/bench_encoders.py [--size 3000x2000] [--images 3] [--output results.json]
+
+Each image is decoded once up front, so only the encoder is timed. Sizes are relative to the
+'balanced' PNG of the same images, which is what conversions produced before profiles existed.
+"""
+import argparse
+from datetime import datetime
+import io
+import json
+from pathlib import Path
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import ALPHA_FORMATS, ENCODER_PROFILES, encoder_options, output_extensions
+from corpus import _with_alpha, synthetic_photo
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+def encode(img, extension: str, options: dict) -> tuple[float, int]:
+    output = io.BytesIO()
+    start = time.perf_counter()
+    img.save(output, extension, **options)
+    return time.perf_counter() - start, output.tell()
+
+def variants() -> list[tuple[str, bool]]:
+    """Every output format, with WebP once lossy and once lossless."""
+    formats = [(extension[1:].upper(), False) for extension in output_extensions()]
+    return formats + [('WEBP', True)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='3000x2000', help="WIDTHxHEIGHT of each synthetic photo")
+    parser.add_argument('--images', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, help="where to write the JSON results (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    rng = np.random.default_rng(args.seed)
+    photos = [synthetic_photo(rng, (width, height)) for _ in range(args.images)]
+    photos = [_with_alpha(img) if i % 2 else img for i, img in enumerate(photos)] # Half of them carry alpha
+
+    rows = []
+    for extension, lossless in variants():
+        images = [img if extension in ALPHA_FORMATS else img.convert('RGB') for img in photos]
+        for profile in ENCODER_PROFILES:
+            options = encoder_options(extension, profile, lossless)
+            seconds, size = 0.0, 0
+            for img in images:
+                elapsed, num_bytes = encode(img, extension, options)
+                seconds += elapsed
+                size += num_bytes
+            rows.append({
+                'format': extension + (' lossless' if lossless else ''),
+                'profile': profile,
+                'options': options,
+                'seconds': round(seconds, 4),
+                'mpixels_per_s': round(width * height * len(images) / 1e6 / seconds, 2),
+                'bytes': size,
+            })
+
+    baseline = next(row['bytes'] for row in rows if row['format'] == 'PNG' and row['profile'] == 'balanced')
+    print(f"{'format':>14} {'profile':>9} {'seconds':>9} {'MP/s':>8} {'MB':>8} {'vs PNG':>7}")
+    for row in rows:
+        row['size_vs_png'] = round(row['bytes'] / baseline, 3)
+        print(f"{row['format']:>14} {row['profile']:>9} {row['seconds']:>9.3f} {row['mpixels_per_s']:>8.1f} "
+              f"{row['bytes'] / (1024 * 1024):>8.2f} {row['size_vs_png']:>6.2f}x")
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': {key: str(value) for key, value in vars(args).items()},
+        'encoders': rows,
+    }
+    output = args.output or RESULTS_DIR / f"encoders-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
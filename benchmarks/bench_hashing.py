@@ -0,0 +1,61 @@
+"""Compares dhash throughput and agreement between full-resolution decodes and open_for_analysis.
+
+Run from the repository root:
+    python benchmarks/bench_hashing.py [--images 8]
+
+ANALYSIS_MAX_DISTANCE was measured with --images 120.
+"""
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+import imagehash
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import ANALYSIS_MAX_DISTANCE, HASH_SIZE, open_for_analysis, read_metadata
+from corpus import synthetic_photo
+
+RESOLUTIONS = [(4000, 3000), (3000, 2000), (6000, 4000), (1600, 1200)] # Cycled through, so scale factors vary
+FORMATS = {'.jpg': {'quality': 90}, '.png': {'compress_level': 1}, '.webp': {'quality': 90}}
+
+def hash_full(src: Path) -> imagehash.ImageHash:
+    with Image.open(src) as img:
+        return imagehash.dhash(img, hash_size=HASH_SIZE)
+
+def hash_analysis(src: Path) -> imagehash.ImageHash:
+    with open_for_analysis(src, read_metadata(src).format) as img:
+        return imagehash.dhash(img, hash_size=HASH_SIZE)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=8, help="photos per format")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {ext: [] for ext in FORMATS}
+        for i in range(args.images):
+            img = synthetic_photo(rng, RESOLUTIONS[i % len(RESOLUTIONS)])
+            for ext, params in FORMATS.items():
+                path = Path(tmp, f"{i}{ext}")
+                img.save(path, **params)
+                files[ext].append(path)
+
+        print(f"{'format':>7} {'full (img/s)':>13} {'analysis (img/s)':>17} {'speedup':>8} {'max dist':>9} {'mean dist':>10}")
+        for ext, paths in files.items():
+            start = time.perf_counter()
+            full = [hash_full(path) for path in paths]
+            full_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            reduced = [hash_analysis(path) for path in paths]
+            analysis_time = time.perf_counter() - start
+
+            distances = [a - b for a, b in zip(full, reduced)]
+            print(f"{ext:>7} {len(paths) / full_time:>13.1f} {len(paths) / analysis_time:>17.1f} {full_time / analysis_time:>7.1f}x {max(distances):>9} {sum(distances) / len(distances):>10.2f}")
+            if max(distances) > ANALYSIS_MAX_DISTANCE:
+                print(f"\tWarning: {ext} drifted past the documented bound of {ANALYSIS_MAX_DISTANCE} bits")
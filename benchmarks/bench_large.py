@@ -0,0 +1,107 @@
+"""Measures peak memory and time of converting one very large image whole versus in strips.
+
+Run from the repository root:
+    python benchmarks/bench_large.py [--size 12000x8000] [--orientation 6] [--profile balanced]
+    python benchmarks/bench_large.py --past-limit
+
+A synthetic photo with an alpha ramp is saved as PNG (and as a rotated JPEG), then each is converted
+to PNG and JPEG by convert_image and by convert_image_tiled, every conversion in a fresh child
+process so its peak resident set can be read on its own (from /proc, so Linux only). Outputs are
+checked to be byte-identical. Both lift Pillow's decompression-bomb limit, as large-image mode does.
+
+--past-limit instead runs the command line on a 187.5 MP PNG, past the 179 MP at which Pillow refuses
+to open an image, once with large-image mode on (it must convert) and once off (it must fail).
+"""
+import argparse
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import ENCODER_PROFILES, convert_image, convert_image_tiled, encoder_options, read_metadata, set_pixel_limit
+from corpus import _with_alpha, synthetic_photo
+
+PAST_LIMIT_SIZE = (15000, 12500)
+
+def peak_rss_kib() -> int:
+    """This process's peak resident set, which unlike ru_maxrss does not carry over the parent's through exec (Linux only)."""
+    with open('/proc/self/status') as f:
+        return int(next(line for line in f if line.startswith('VmHWM:')).split()[1])
+
+def child(mode: str, src: Path, dst: Path, extension: str, profile: str):
+    """Runs one conversion and prints its seconds and the peak RSS it added over the imports."""
+    set_pixel_limit(100) # A fresh process, as a pipeline worker is
+    baseline = peak_rss_kib()
+    convert = convert_image_tiled if mode == 'strips' else convert_image
+    image_mode = 'RGBA' if extension == 'PNG' else 'RGB'
+    start = time.perf_counter()
+    convert(src, dst, extension, image_mode, read_metadata(src).format, encoder_options(extension, profile))
+    seconds = time.perf_counter() - start
+    print(seconds, peak_rss_kib() - baseline)
+
+def past_limit(tmp: Path):
+    """Converts an image Pillow's decompression-bomb limit would refuse through main.py, with and without large-image mode."""
+    width, height = PAST_LIMIT_SIZE
+    # Tiled from a small photo, since generating one at full size needs more memory than converting it
+    tile = np.asarray(synthetic_photo(np.random.default_rng(0), (width // 10, height // 10)))
+    src_dir = tmp / 'input'
+    src_dir.mkdir()
+    Image.fromarray(np.tile(tile, (10, 10, 1))).save(src_dir / 'scan.png', compress_level=1)
+    print(f"{width}x{height} PNG, {width * height / 1e6:.1f} MP")
+    for large_image_mp, expected in ((100, 0), (0, 1)):
+        output = tmp / f'output-{large_image_mp}'
+        start = time.perf_counter()
+        status = subprocess.run([sys.executable, str(Path(__file__).resolve().parent.parent / 'main.py'), '--input', str(src_dir), '--output', str(output),
+                                 '--dupes', str(tmp / 'dupes'), '--cache', str(tmp / 'cache.sqlite'), '--filter-dupes', '--no-resume',
+                                 '--large-image-mp', str(large_image_mp)], capture_output=True).returncode
+        seconds = time.perf_counter() - start
+        converted = [read_metadata(path)[1:3] for path in output.glob('*.png')]
+        ok = status == expected and converted == ([(width, height)] if expected == 0 else [])
+        print(f"--large-image-mp {large_image_mp:<3}  exit {status}  outputs {converted}  {seconds:.1f}s  {'ok' if ok else 'FAILED'}")
+
+def measure(mode: str, src: Path, dst: Path, extension: str, profile: str) -> tuple[float, float]:
+    output = subprocess.run([sys.executable, __file__, '--child', mode, str(src), str(dst), extension, profile], check=True, capture_output=True, text=True).stdout
+    seconds, kib = output.split()
+    return float(seconds), int(kib) / 1024
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], Path(sys.argv[3]), Path(sys.argv[4]), sys.argv[5], sys.argv[6])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='12000x8000', help="WIDTHxHEIGHT of the synthetic image")
+    parser.add_argument('--orientation', type=int, default=6, help="EXIF orientation of the JPEG source")
+    parser.add_argument('--profile', choices=ENCODER_PROFILES, default='balanced')
+    parser.add_argument('--past-limit', action='store_true', help="check an image past Pillow's pixel limit end to end instead")
+    args = parser.parse_args()
+
+    set_pixel_limit(100)
+    if args.past_limit:
+        with tempfile.TemporaryDirectory() as tmp:
+            past_limit(Path(tmp))
+        sys.exit()
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        photo = synthetic_photo(np.random.default_rng(0), (width, height))
+        sources = {'PNG+alpha': tmp / 'source.png', f'JPEG o{args.orientation}': tmp / 'source.jpg'}
+        _with_alpha(photo).save(sources['PNG+alpha'], compress_level=1)
+        exif = Image.Exif()
+        exif[0x0112] = args.orientation
+        photo.save(sources[f'JPEG o{args.orientation}'], quality=90, exif=exif)
+        del photo
+        raster_mb = width * height * 4 / (1024 * 1024)
+        print(f"{width}x{height}, one RGBA raster is {raster_mb:.0f} MB, profile {args.profile}")
+        print(f"{'source':>12} {'output':>7} {'whole MB':>9} {'strips MB':>10} {'whole s':>8} {'strips s':>9} {'same':>5}")
+        for label, src in sources.items():
+            for extension in ('PNG', 'JPEG'):
+                whole_s, whole_mb = measure('whole', src, tmp / 'whole.out', extension, args.profile)
+                strips_s, strips_mb = measure('strips', src, tmp / 'strips.out', extension, args.profile)
+                same = (tmp / 'whole.out').read_bytes() == (tmp / 'strips.out').read_bytes()
+                print(f"{label:>12} {extension:>7} {whole_mb:>9.0f} {strips_mb:>10.0f} {whole_s:>8.2f} {strips_s:>9.2f} {str(same):>5}")
@@ -0,0 +1,67 @@
+"""Measures opening and querying a large persistent library index against a brute-force scan.
+
+Run from the repository root:
+    python benchmarks/bench_library.py [--entries 500000] [--queries 200]
+
+Random 64-bit hashes are added to a LibraryIndex in a temporary folder and saved, then the index is
+reopened (which only memory-maps the arrays) and queried at a few radii, half the queries being
+near copies of stored hashes. Every result is checked against a popcount over all the hashes.
+"""
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import LibraryIndex, _popcount
+
+def near_copy(rng: np.random.Generator, hash_value: int, bits: int) -> int:
+    for bit in rng.choice(64, size=bits, replace=False):
+        hash_value ^= 1 << int(bit)
+    return hash_value
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=500_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**64, size=args.entries, dtype=np.uint64)
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp) / '.imageflow_library'
+        start = time.perf_counter()
+        library = LibraryIndex(directory)
+        for i, hash_value in enumerate(hashes):
+            library.add(f'Image {i + 1}.jpeg', f'/photos/{i}.jpg', 0, 0, format(int(hash_value), '016x'))
+        library.save()
+        library.close()
+        print(f"{args.entries} entries built and saved in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        library = LibraryIndex(directory)
+        print(f"Reopened in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        queries = [
+            near_copy(rng, int(hashes[rng.integers(args.entries)]), int(rng.integers(0, 6))) if i % 2 else int(rng.integers(0, 2**63))
+            for i in range(args.queries)
+        ]
+        print(f"{'radius':>6} {'index ms':>9} {'scan ms':>8} {'matches':>8} {'same':>5}")
+        for radius in (0, 5, 10):
+            index_s = scan_s = 0.0
+            matches = 0
+            same = True
+            for query in queries:
+                start = time.perf_counter()
+                found = sorted(int(entry.output.split()[1][:-5]) - 1 for entry, _ in library.query(query, radius))
+                index_s += time.perf_counter() - start
+                start = time.perf_counter()
+                expected = np.flatnonzero(_popcount(hashes ^ np.uint64(query)) <= radius).tolist()
+                scan_s += time.perf_counter() - start
+                matches += len(found)
+                same &= found == expected
+            print(f"{radius:>6} {index_s * 1000 / len(queries):>9.2f} {scan_s * 1000 / len(queries):>8.2f} {matches:>8} {str(same):>5}")
+        library.close()
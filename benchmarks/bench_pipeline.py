@@ -0,0 +1,151 @@
+"""Times each stage of Pipeline.run on a synthetic corpus and saves the results as JSON.
+
+Run from the repository root:
+    python benchmarks/bench_pipeline.py [--scale small] [--workers N] [--compare earlier.json]
+
+Stages are scan, metadata, hash, hash (cached), group, sort, convert and rename. Each one reports
+files/s, MB/s of input and the peak resident memory so far, of this process and of any worker process.
+"""
+import argparse
+import contextlib
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import Pipeline
+from corpus import SCALES, generate_corpus
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+def peak_rss_mb(who: int) -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024 # Bytes on macOS, KiB elsewhere
+
+def input_bytes(app: Pipeline) -> int:
+    return sum(Path(os.path.join(app.input_path, filename)).stat().st_size for filename in app.unsorted_images)
+
+def measure(results: list, stage: str, fn, num_files: int, num_bytes: int):
+    """Runs one stage with its console output silenced and appends its timings to results."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        value = fn()
+        seconds = time.perf_counter() - start
+    results.append({
+        'stage': stage,
+        'seconds': round(seconds, 4),
+        'files': num_files,
+        'files_per_s': round(num_files / seconds, 2) if seconds else None,
+        'mb_per_s': round(num_bytes / (1024 * 1024) / seconds, 2) if seconds else None,
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_worker_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    })
+    print(f"{stage:>14} {seconds:>9.3f}s {results[-1]['files_per_s'] or 0:>10.1f} files/s {results[-1]['mb_per_s'] or 0:>9.1f} MB/s")
+    return value
+
+def make_app(workdir: Path, args: argparse.Namespace) -> Pipeline:
+    """A Pipeline configured the way convert_command would, working inside workdir."""
+    app = Pipeline()
+    app.input_path = workdir / 'Input'
+    app.output_path = workdir / 'Output'
+    app.dupes_path = workdir / 'Duplicates'
+    app.cache_path = workdir / '.imageflow_cache.sqlite'
+    app.name = "Bench"
+    app.filter_dupes = True
+    app.tolerance = args.tolerance
+    app.dimension = 'width'
+    app.workers = args.workers
+    app.resume = False
+    app.extension = 'PNG'
+    app.image_mode = 'RGBA'
+    return app
+
+def run_stages(workdir: Path, args: argparse.Namespace) -> list:
+    results = []
+    app = make_app(workdir, args)
+
+    measure(results, 'scan', app.ensure_dirs, 0, 0)
+    num_files, num_bytes = len(app.unsorted_images), input_bytes(app)
+    results[-1]['files'] = num_files
+    measure(results, 'metadata', app._scan_metadata, num_files, num_bytes)
+    hashes = measure(results, 'hash', app._hash_images, num_files, num_bytes)
+    measure(results, 'hash (cached)', app._hash_images, num_files, num_bytes)
+    measure(results, 'group', lambda: app._group_dupes(hashes), num_files, 0)
+
+    num_files, num_bytes = len(app.unsorted_images), input_bytes(app)
+    sorted_images = measure(results, 'sort', app._sort_images, num_files, 0)
+    jobs = app._assign_numbers(sorted_images, "Bench ")
+    measure(results, 'convert', lambda: app._process(jobs), num_files, num_bytes)
+
+    shutil.rmtree(app.output_path)
+    app.output_path.mkdir()
+    app.rename_only = True
+    jobs = app._assign_numbers(sorted_images, "Bench ")
+    measure(results, 'rename', lambda: app._process(jobs), num_files, num_bytes)
+    if app.errors:
+        print(f"Warning: {len(app.errors)} file(s) failed during the benchmark")
+    return results
+
+def compare(results: dict, baseline_path: Path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {stage['stage']: stage for stage in json.load(f)['stages']}
+    print(f"\nCompared with {baseline_path.name} (above 1.0x is faster now):")
+    for stage in results['stages']:
+        before = baseline.get(stage['stage'])
+        if before and stage['seconds'] and before['seconds']:
+            print(f"{stage['stage']:>14} {before['seconds'] / stage['seconds']:>6.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tolerance', type=float, default=5.0)
+    parser.add_argument('--output', type=Path, help="where to write the JSON results (default: benchmarks/results/)")
+    parser.add_argument('--compare', type=Path, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        print(f"Generating the '{args.scale}' corpus...")
+        manifest = generate_corpus(workdir, args.scale, args.seed)
+        stages = run_stages(workdir, args)
+        moved = {path.name for path in (workdir / 'Duplicates').iterdir()}
+
+    planted = [dupe for dupe in manifest['near_duplicates'] if dupe['distance'] <= args.tolerance]
+    found = sum(dupe['duplicate'] in moved or dupe['original'] in moved for dupe in planted)
+    print(f"Found {found} of {len(planted)} planted near-duplicates within tolerance.")
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'args': {key: str(value) for key, value in vars(args).items()},
+        'corpus': {
+            'files': len(manifest['files']),
+            'bytes': sum(file['bytes'] for file in manifest['files']),
+            'near_duplicates': manifest['near_duplicates'],
+        },
+        'stages': stages,
+    }
+    output = args.output or RESULTS_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,56 @@
+"""Times converting a camera RAW file under each RAW development preset.
+
+Run from the repository root:
+    python benchmarks/bench_raw.py [--size 6000x4000] [--preview-scale 1.0] [--extension JPEG] [--profile balanced]
+
+A synthetic photo is written as a 14-bit DNG named .nef with an embedded JPEG preview (see
+corpus.synthetic_raw), then encode_image converts it under every preset, plus full and half at 16
+bits when the output is PNG. Each conversion runs a few times and the fastest is reported, split into
+developing and encoding.
+"""
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import ENCODER_PROFILES, RAW_PRESETS, encode_image, encoder_options
+from corpus import synthetic_photo, synthetic_raw
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='6000x4000', help="WIDTHxHEIGHT of the sensor")
+    parser.add_argument('--preview-scale', type=float, default=1.0, help="size of the embedded preview relative to the sensor, 0 for none")
+    parser.add_argument('--extension', choices=['PNG', 'JPEG', 'WEBP'], default='JPEG')
+    parser.add_argument('--profile', choices=ENCODER_PROFILES, default='balanced')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    image_mode = 'RGB' if args.extension == 'JPEG' else 'RGBA'
+    save_options = encoder_options(args.extension, args.profile)
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'synthetic.nef'
+        synthetic_raw(synthetic_photo(np.random.default_rng(0), (width, height)), src, orientation=6, preview_scale=args.preview_scale)
+        data = src.read_bytes()
+        runs = [(preset, 8) for preset in RAW_PRESETS]
+        if args.extension == 'PNG':
+            runs += [('full', 16), ('half', 16)]
+        print(f"{width}x{height} RAW, preview at {args.preview_scale:g}x, to {args.extension} ({args.profile})")
+        print(f"{'preset':>8} {'bits':>4} {'develop s':>10} {'encode s':>9} {'total s':>8} {'speedup':>8} {'output KB':>10}")
+        baseline = None
+        for preset, bits in runs:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                encoded, timings = encode_image(data, args.extension, image_mode, 'RAW', save_options, preset, bits)
+                total = time.perf_counter() - start
+                if best is None or total < best[0]:
+                    best = (total, timings, len(encoded))
+            total, timings, size = best
+            baseline = baseline or total
+            develop = timings['decode'] + timings['transform']
+            print(f"{preset:>8} {bits:>4} {develop:>10.2f} {timings['encode']:>9.2f} {total:>8.2f} {baseline / total:>7.1f}x {size / 1024:>10.0f}")
@@ -0,0 +1,57 @@
+"""Times the input scan on a nested, card-dump-like tree of many small files.
+
+Run from the repository root:
+    python benchmarks/bench_scan.py [--files 100000] [--per-folder 500]
+
+Compares a pathlib walk that stats every entry (what ensure_dirs did, made recursive) with
+scan_images trusting suffixes and scan_images sniffing magic bytes. The files are only headers,
+so the numbers measure directory traversal and metadata calls rather than disk throughput.
+"""
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import IMAGE_EXTENSIONS, scan_images
+
+HEADERS = {
+    '.jpg': b'\xff\xd8\xff\xe1' + bytes(60),
+    '.png': b'\x89PNG\r\n\x1a\n' + bytes(56),
+    '.nef': b'MM\x00*' + bytes(60),
+    '.xmp': b'<x:xmpmeta xmlns:x="adobe:ns:meta/">' + bytes(28), # Sidecars the scan must skip
+}
+
+def build_tree(root: Path, num_files: int, per_folder: int):
+    """Lays files out like camera cards: card/DCIM/NNNCAMERA/IMG_NNNN.ext."""
+    suffixes = list(HEADERS)
+    for i in range(num_files):
+        folder = root / f"card{i // (per_folder * 10):02d}" / 'DCIM' / f"{100 + i // per_folder % 10}CAMERA"
+        if i % per_folder == 0:
+            folder.mkdir(parents=True, exist_ok=True)
+        suffix = suffixes[i % len(suffixes)]
+        (folder / f"IMG_{i:06d}{suffix}").write_bytes(HEADERS[suffix])
+
+def pathlib_walk(root: Path) -> int:
+    return sum(1 for path in root.rglob('*') if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS and path.stat().st_size >= 0)
+
+def timed(label: str, fn, num_files: int):
+    start = time.perf_counter()
+    found = fn()
+    seconds = time.perf_counter() - start
+    print(f"{label:>22} {seconds:>8.3f}s {num_files / seconds:>12,.0f} entries/s {found:>8} images")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--per-folder', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"Building {args.files:,} files...")
+        build_tree(root, args.files, args.per_folder)
+        timed('pathlib walk + stat', lambda: pathlib_walk(root), args.files)
+        timed('scandir by suffix', lambda: sum(1 for _ in scan_images(root, sniff=False)), args.files)
+        timed('scandir + sniffing', lambda: sum(1 for _ in scan_images(root, sniff=True)), args.files)
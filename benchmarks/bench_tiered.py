@@ -0,0 +1,76 @@
+"""Compares duplicate filtering with and without the exact-copy tier on heavily duplicated input.
+
+Run from the repository root:
+    python benchmarks/bench_tiered.py [--scale small] [--copies 2] [--confirm-hash phash]
+
+The corpus is copied into --copies extra card-dump folders, as overlapping imports produce. The
+dhash-only run hashes every file; the tiered run first digests same-sized files, moves the exact
+copies aside, and hashes only what is left. Both runs start from an empty hash cache. With
+--confirm-hash, the decode cache's reuse is printed too.
+"""
+import argparse
+import contextlib
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import CONFIRM_HASHES, DecodeCache, Pipeline
+from corpus import SCALES, generate_corpus
+
+def make_pipeline(workdir: Path, confirm_hash: str) -> Pipeline:
+    pipeline = Pipeline()
+    pipeline.input_path = workdir / 'Input'
+    pipeline.output_path = workdir / 'Output'
+    pipeline.dupes_path = workdir / 'Duplicates'
+    pipeline.cache_path = workdir / '.imageflow_cache.sqlite'
+    pipeline.configure({'filter_dupes': True, 'confirm_hash': confirm_hash})
+    pipeline.decode_cache = DecodeCache(pipeline.decode_cache_mb * 1024 * 1024) # _run_stages would make this
+    return pipeline
+
+def run(workdir: Path, tiered: bool, confirm_hash: str) -> dict:
+    pipeline = make_pipeline(workdir, confirm_hash)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        pipeline.ensure_dirs()
+        pipeline._scan_metadata()
+        num_files = len(pipeline.unsorted_images)
+        start = time.perf_counter()
+        if tiered:
+            pipeline._filter_dupes()
+        else:
+            hashes = pipeline._hash_images()
+            pipeline._group_dupes(hashes)
+        seconds = time.perf_counter() - start
+    return {'files': num_files, 'seconds': seconds, 'decoded': len(pipeline.hashes) if tiered else num_files, 'kept': len(pipeline.unsorted_images),
+            'decode_cache': pipeline.decode_cache.summary()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--copies', type=int, default=2, help="extra copies of the whole corpus")
+    parser.add_argument('--confirm-hash', choices=CONFIRM_HASHES, default='none')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pristine = Path(tmp) / 'pristine'
+        generate_corpus(pristine, args.scale, args.seed)
+        for i in range(args.copies):
+            shutil.copytree(pristine / 'Input', pristine / 'Input' / f"dump{i + 2}", ignore=shutil.ignore_patterns('dump*'))
+
+        results = {}
+        for label, tiered in (('dhash only', False), ('tiered', True)):
+            workdir = Path(tmp) / label.replace(' ', '_')
+            shutil.copytree(pristine, workdir)
+            results[label] = run(workdir, tiered, args.confirm_hash)
+
+    print(f"{'':>12} {'files':>7} {'decoded':>8} {'kept':>6} {'seconds':>9}")
+    for label, result in results.items():
+        print(f"{label:>12} {result['files']:>7} {result['decoded']:>8} {result['kept']:>6} {result['seconds']:>9.3f}")
+    if args.confirm_hash != 'none':
+        for label, result in results.items():
+            print(f"{label:>12} decode cache: {result['decode_cache']}")
+    print(f"Speedup: {results['dhash only']['seconds'] / results['tiered']['seconds']:.2f}x")
@@ -0,0 +1,103 @@
+"""Measures watch mode's latency from a file landing in Input to its converted output appearing.
+
+Run from the repository root:
+    python benchmarks/bench_watch.py [--indexed 50000] [--drops 20] [--size 1600x1200] [--polling]
+
+The index is seeded with --indexed random hashes as if an earlier batch had kept that many images,
+then --drops synthetic JPEGs are written into Input one at a time, each in a few chunks like a
+tethering app would, and the time from the last write to the output file existing is recorded.
+"""
+import argparse
+import io
+import os
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import imagehash
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main
+from main import HASH_SIZE, Pipeline
+from corpus import synthetic_photo
+
+class SeededPipeline(Pipeline):
+    """A Pipeline whose batch pretends to have kept `seed_hashes` more images, so the watch index starts large."""
+    seed_hashes = 0
+
+    def _run_stages(self):
+        super()._run_stages()
+        rng = np.random.default_rng(1)
+        for i in range(self.seed_hashes):
+            filename = f"earlier/{i:06d}.jpg"
+            self.unsorted_images.append(filename)
+            self.hashes[filename] = imagehash.ImageHash(rng.integers(0, 2, (HASH_SIZE, HASH_SIZE)).astype(bool))
+
+def drop(path: Path, data: bytes, chunks: int=4):
+    with open(path, 'wb') as f:
+        step = len(data) // chunks + 1
+        for i in range(0, len(data), step):
+            f.write(data[i:i + step])
+            f.flush()
+            time.sleep(0.02)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--indexed', type=int, default=50000)
+    parser.add_argument('--drops', type=int, default=20)
+    parser.add_argument('--size', default='1600x1200', help="WIDTHxHEIGHT of each dropped photo")
+    parser.add_argument('--extension', default='.jpeg', help="output format")
+    parser.add_argument('--polling', action='store_true', help="disable inotify to time the polling fallback")
+    args = parser.parse_args()
+
+    if args.polling:
+        def no_inotify():
+            raise OSError("inotify disabled by --polling")
+        main._Inotify = no_inotify
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    rng = np.random.default_rng(0)
+    photos = []
+    for _ in range(args.drops):
+        buffer = io.BytesIO()
+        synthetic_photo(rng, (width, height)).save(buffer, 'JPEG', quality=90)
+        photos.append(buffer.getvalue())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        pipeline = SeededPipeline()
+        pipeline.seed_hashes = args.indexed
+        pipeline.input_path = workdir / 'Input'
+        pipeline.output_path = workdir / 'Output'
+        pipeline.dupes_path = workdir / 'Duplicates'
+        pipeline.cache_path = workdir / '.imageflow_cache.sqlite'
+        pipeline.configure({'name': 'Watch', 'extension': args.extension, 'filter_dupes': True, 'watch': True, 'resume': True})
+        ready = threading.Event()
+        pipeline.metrics_listeners.append(lambda event: event['type'] == 'log' and event['message'].startswith('Watching') and ready.set())
+
+        stop = threading.Event()
+        watcher = threading.Thread(target=pipeline.run, args=(stop,), daemon=True)
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull # The pipeline logs every file
+            try:
+                watcher.start()
+                ready.wait()
+                latencies = []
+                for i, data in enumerate(photos):
+                    drop(pipeline.input_path / f"DSC{i:05d}.jpg", data)
+                    landed = time.perf_counter()
+                    output = pipeline.output_path / f"Watch {i + 1}.{args.extension.lstrip('.')}"
+                    while not output.exists():
+                        time.sleep(0.005)
+                    latencies.append(time.perf_counter() - landed)
+            finally:
+                stop.set()
+                watcher.join()
+                sys.stdout = stdout
+
+    mode = 'polling' if args.polling else 'inotify (where available)'
+    print(f"{args.drops} drops, {args.indexed:,} hashes indexed, {mode}, settle {pipeline.watch_settle}s")
+    print(f"latency: mean {statistics.mean(latencies):.3f}s, median {statistics.median(latencies):.3f}s, max {max(latencies):.3f}s")
@@ -0,0 +1,188 @@
+"""Generates a deterministic synthetic image corpus for the benchmarks.
+
+The same seed and scale always produce the same pixels, so timings from different runs or machines
+can be compared. Run from the repository root to build a corpus by hand:
+    python benchmarks/corpus.py <directory> [--scale small|medium|large] [--seed 0]
+"""
+import argparse
+import json
+from pathlib import Path
+import sys
+
+import imagehash
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import HASH_SIZE, open_for_analysis, read_metadata
+
+SCALES = {
+    # photos, photo resolution, large images, large resolution
+    'small': (25, (1600, 1200), 1, (6000, 4000)),
+    'medium': (100, (3000, 2000), 2, (8000, 6000)),
+    'large': (400, (4000, 3000), 4, (12000, 8000)),
+}
+DUPLICATE_EVERY = 4 # Every fourth photo gets a planted near-duplicate
+
+def synthetic_photo(rng: np.random.Generator, size: tuple[int, int]) -> Image.Image:
+    """Smooth random structure plus sensor-like noise, so hashes and encoders behave as they do on photos."""
+    width, height = size
+    # The structure is low-frequency, so it is built at a quarter of the size and scaled up
+    small_w, small_h = max(width // 4, 1), max(height // 4, 1)
+    y, x = np.mgrid[0:small_h, 0:small_w].astype(np.float32)
+    channels = []
+    for _ in range(3):
+        field = np.zeros((small_h, small_w), dtype=np.float32)
+        for _ in range(6):
+            fx, fy = rng.uniform(0.2, 6, size=2) * 2 * np.pi
+            field += rng.uniform(0.3, 1) * np.sin(fx * x / small_w + fy * y / small_h + rng.uniform(0, 2 * np.pi))
+        channels.append(field)
+    pixels = np.stack(channels, axis=-1)
+    pixels = (pixels - pixels.min()) / (pixels.max() - pixels.min()) * 235
+    img = Image.fromarray(pixels.astype(np.uint8)).resize(size, Image.Resampling.BICUBIC)
+    noise = rng.standard_normal((height, width, 3), dtype=np.float32) * 6
+    return Image.fromarray(np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+def _with_alpha(img: Image.Image) -> Image.Image:
+    """Adds a diagonal alpha ramp so alpha flattening and RGBA encoding get exercised."""
+    width, height = img.size
+    ramp = np.add.outer(np.arange(height), np.arange(width)) * 255 // max(width + height - 2, 1)
+    rgba = img.convert('RGBA')
+    rgba.putalpha(Image.fromarray(ramp.astype(np.uint8)))
+    return rgba
+
+def _tiff_ifd(entries: list[tuple[int, int, list]], offset: int) -> bytes:
+    """Packs one little-endian TIFF IFD written at offset, followed by the values too long to fit in its entries."""
+    import struct
+    formats = {1: 'B', 2: 's', 3: 'H', 4: 'I', 10: 'ii'}
+    overflow_start = offset + 2 + len(entries) * 12 + 4
+    ifd, overflow = struct.pack('<H', len(entries)), bytearray()
+    for tag, kind, values in sorted(entries):
+        data = values + b'\0' if kind == 2 else b''.join(struct.pack('<' + formats[kind], *(v if isinstance(v, tuple) else (v,))) for v in values)
+        count = len(data) if kind == 2 else len(values)
+        if len(data) > 4:
+            value = struct.pack('<I', overflow_start + len(overflow))
+            overflow += data + b'\0' * (len(data) % 2)
+        else:
+            value = data.ljust(4, b'\0')
+        ifd += struct.pack('<HHI', tag, kind, count) + value
+    return ifd + struct.pack('<I', 0) + overflow
+
+def synthetic_raw(photo: Image.Image, path: Path, orientation: int=1, preview_scale: float=1.0):
+    """Writes a photo as a minimal 14-bit RGGB DNG, which LibRaw develops like a camera RAW file.
+
+    The photo is the sensor's (unrotated) view; orientation goes in the EXIF tag. IFD0 holds an
+    embedded JPEG preview at preview_scale of the sensor's size (left out at 0) and a SubIFD the
+    mosaic, as cameras lay them out. Name the file .nef or .arw so ImageFlow treats it as RAW.
+    """
+    import io
+    linear = (np.asarray(photo, dtype=np.float32) / 255) ** 2.2 * 16383
+    height, width = linear.shape[:2]
+    mosaic = np.empty((height, width), dtype='<u2')
+    mosaic[0::2, 0::2] = linear[0::2, 0::2, 0] # R
+    mosaic[0::2, 1::2] = linear[0::2, 1::2, 1] # G
+    mosaic[1::2, 0::2] = linear[1::2, 0::2, 1] # G
+    mosaic[1::2, 1::2] = linear[1::2, 1::2, 2] # B
+    raw_data = mosaic.tobytes()
+    preview, preview_size = b'', (0, 0)
+    if preview_scale:
+        preview_size = (round(width * preview_scale), round(height * preview_scale))
+        buffer = io.BytesIO()
+        photo.resize(preview_size).save(buffer, 'JPEG', quality=90)
+        preview = buffer.getvalue()
+
+    def layout(raw_ifd_offset: int, raw_offset: int, preview_offset: int) -> tuple[bytes, bytes]:
+        main = [
+            (254, 4, [1 if preview else 0]), (271, 2, b'ImageFlow'), (272, 2, b'Synthetic'), (274, 3, [orientation]),
+            (50706, 1, [1, 4, 0, 0]), (50708, 2, b'ImageFlow Synthetic'), (50778, 3, [21]), # D65
+            (50721, 10, [(1, 1), (0, 1), (0, 1), (0, 1), (1, 1), (0, 1), (0, 1), (0, 1), (1, 1)]), # Identity ColorMatrix1
+            (330, 4, [raw_ifd_offset]),
+        ]
+        if preview:
+            main += [(256, 4, [preview_size[0]]), (257, 4, [preview_size[1]]), (258, 3, [8, 8, 8]), (259, 3, [7]), (262, 3, [6]),
+                     (273, 4, [preview_offset]), (277, 3, [3]), (278, 4, [preview_size[1]]), (279, 4, [len(preview)])]
+        raw = [
+            (254, 4, [0]), (256, 4, [width]), (257, 4, [height]), (258, 3, [16]), (259, 3, [1]), (262, 3, [32803]), # CFA
+            (273, 4, [raw_offset]), (277, 3, [1]), (278, 4, [height]), (279, 4, [len(raw_data)]),
+            (33421, 3, [2, 2]), (33422, 1, [0, 1, 1, 2]), (50717, 4, [16383]), # RGGB, 14-bit white level
+        ]
+        main_ifd = _tiff_ifd(main, 8)
+        return main_ifd, _tiff_ifd(raw, 8 + len(main_ifd))
+
+    # The sizes don't depend on the offsets, so one pass finds them and a second fills them in
+    main_ifd, raw_ifd = layout(0, 0, 0)
+    raw_offset = 8 + len(main_ifd) + len(raw_ifd)
+    main_ifd, raw_ifd = layout(8 + len(main_ifd), raw_offset, raw_offset + len(raw_data))
+    with open(path, 'wb') as f:
+        f.write(b'II*\0\x08\0\0\0' + main_ifd + raw_ifd + raw_data + preview)
+
+def _analysis_hash(path: Path) -> imagehash.ImageHash:
+    with open_for_analysis(path, read_metadata(path).format) as img:
+        return imagehash.dhash(img, hash_size=HASH_SIZE)
+
+def generate_corpus(directory: Path, scale: str='small', seed: int=0) -> dict:
+    """Writes the corpus to directory/Input and returns its manifest, also saved as directory/manifest.json.
+
+    Photos cycle through PNG, PNG with alpha, JPEG with each EXIF orientation, WebP and plain JPEG.
+    Planted near-duplicates are recompressed, resized or brightened copies whose Hamming distance to
+    their original, under the same hash the pipeline uses, is recorded in the manifest.
+    """
+    num_photos, photo_size, num_large, large_size = SCALES[scale]
+    rng = np.random.default_rng(seed)
+    input_dir = directory / 'Input'
+    input_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {'scale': scale, 'seed': seed, 'files': [], 'near_duplicates': []}
+
+    def save(img: Image.Image, name: str, kind: str, **params) -> Path:
+        path = input_dir / name
+        img.save(path, **params)
+        manifest['files'].append({'name': name, 'kind': kind, 'width': img.width, 'height': img.height, 'bytes': path.stat().st_size})
+        return path
+
+    for i in range(num_photos):
+        img = synthetic_photo(rng, photo_size)
+        variant = i % 5
+        if variant == 0:
+            path = save(img, f"photo_{i:04d}.png", 'png', compress_level=6)
+        elif variant == 1:
+            path = save(_with_alpha(img), f"photo_{i:04d}_alpha.png", 'png-alpha', compress_level=6)
+        elif variant == 2:
+            exif = Image.Exif()
+            exif[0x0112] = i // 5 % 8 + 1 # Cycles through all eight orientations
+            path = save(img, f"photo_{i:04d}_exif.jpg", f'jpeg-orientation-{exif[0x0112]}', quality=90, exif=exif)
+        elif variant == 3:
+            path = save(img, f"photo_{i:04d}.webp", 'webp', quality=90)
+        else:
+            path = save(img, f"photo_{i:04d}.jpg", 'jpeg', quality=90)
+
+        if i % DUPLICATE_EVERY == 0:
+            edit = i // DUPLICATE_EVERY % 3
+            if edit == 0:
+                duplicate, kind = img, 'recompressed'
+            elif edit == 1:
+                duplicate, kind = img.resize((img.width // 2, img.height // 2), Image.Resampling.LANCZOS), 'half-size'
+            else:
+                duplicate, kind = Image.eval(img, lambda v: min(255, v + 12)), 'brightened'
+            duplicate_path = save(duplicate, f"photo_{i:04d}_copy.jpg", f'near-duplicate-{kind}', quality=75)
+            manifest['near_duplicates'].append({
+                'original': path.name,
+                'duplicate': duplicate_path.name,
+                'edit': kind,
+                'distance': int(_analysis_hash(path) - _analysis_hash(duplicate_path))
+            })
+
+    for i in range(num_large):
+        save(synthetic_photo(rng, large_size), f"large_{i:02d}.jpg", 'jpeg-large', quality=90)
+
+    with open(directory / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    manifest = generate_corpus(args.directory, args.scale, args.seed)
+    print(f"Wrote {len(manifest['files'])} files to {args.directory / 'Input'}")
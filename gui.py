@@ -0,0 +1,494 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+from typing import Any, Dict, Optional
+
+from main import Pipeline, output_extensions
+
+class InputPanel(tk.Frame):
+    def __init__(self, master: Optional[tk.Widget]=None, **kwargs):
+        super().__init__(master, **kwargs)
+
+        # Housekeeping
+        self._CTRL_CHARS_RE = re.compile(r"[\x00-\x1F]") # ASCII control chars 0x00–0x1F (NUL through Unit Separator)
+        self._WINDOWS_RESERVED = {
+            "CON", "PRN", "AUX", "NUL",
+            *(f"COM{i}" for i in range(1, 10)),
+            *(f"LPT{i}" for i in range(1, 10))
+        }
+
+        # Configuration
+        self.font = ('Arial', 12)
+        self.font_small = ('Arial', 10)
+        self.font_mono = ('Courier New', 12)
+
+        # Variables
+        self._init_variables()
+
+        # UI Setup
+        self._create_widgets()
+        self._setup_binds()
+        self._setup_layout()
+
+        # Sets defaults
+        self.sort_dims_combobox.current(0) # None
+        self.exts_combobox.current(0) # .png
+        self.transfer_combobox.current(0) # Copy
+        self.profile_combobox.current(1) # Balanced
+        self.raw_combobox.current(0) # Full
+        self.confirm_combobox.current(0) # None
+        self.name_entry.focus()
+
+    def _init_variables(self):
+        """Initializes Tkinter variables and traces."""
+        self.name_var = tk.StringVar()
+        self.name_var.trace_add("write", self.on_name_change)
+
+        self.number_var = tk.StringVar()
+        self.number_var.trace_add("write", self.on_number_change)
+
+        self.space_var = tk.BooleanVar(value=True)
+
+        self.rename_var = tk.BooleanVar(value=False)
+
+        self.filter_dupes_var = tk.BooleanVar(value=False)
+
+        self.tolerance_var = tk.DoubleVar(value=5.0)
+
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+
+        self.memory_limit_var = tk.IntVar(value=2048)
+
+        self.decode_cache_var = tk.IntVar(value=256)
+
+        self.large_image_var = tk.IntVar(value=100)
+
+        self.resume_var = tk.BooleanVar(value=True)
+
+        self.library_var = tk.BooleanVar(value=True)
+
+        self.trace_var = tk.BooleanVar(value=False)
+
+        self.lossless_var = tk.BooleanVar(value=False)
+
+        self.raw16_var = tk.BooleanVar(value=False)
+
+        self.include_var = tk.StringVar(value="*")
+
+        self.exclude_var = tk.StringVar(value=".*")
+
+        self.recursive_var = tk.BooleanVar(value=True)
+
+        self.sniff_var = tk.BooleanVar(value=True)
+
+        self.watch_var = tk.BooleanVar(value=False)
+
+    def _create_widgets(self):
+        """Initializes all widgets."""
+        # Validation variables
+        name_vc = (self.register(self.validate_name), '%P')
+        number_vc = (self.register(self.validate_number), '%P')
+
+        # --- Row 0 ---
+        self.name_label = tk.Label(self, text="Image name", font=self.font)
+        self.row0_frame = tk.Frame(self)
+        self.name_entry = ttk.Entry(self.row0_frame, textvariable=self.name_var, validate="key", validatecommand=name_vc, width=22, font=self.font)
+        self.space_check = tk.Checkbutton(self.row0_frame, variable=self.space_var, text="Presume space?", command=self.on_name_change, font=self.font_small)
+        self.rename_check = tk.Checkbutton(self.row0_frame, variable=self.rename_var, text="Rename only?", command=self.on_rename_change, font=self.font_small)
+        self.transfer_combobox = ttk.Combobox(self.row0_frame, values=["Copy", "Hardlink", "Reflink", "Move", "Auto"], width=8, font=self.font_small, state="disabled")
+
+        # --- Row 1 ---
+        self.number_label = tk.Label(self, text="Starting number", font=self.font)
+        self.row1_frame = tk.Frame(self)
+        self.number_entry = ttk.Entry(self.row1_frame, textvariable=self.number_var, validate="key", validatecommand=number_vc, width=4, font=self.font)
+        self.sort_dims_label = tk.Label(self.row1_frame, text="Sort dimension", font=self.font_small)
+        self.sort_dims_combobox = ttk.Combobox(self.row1_frame, values=["None", "Width", "Height"], width=6, font=self.font_small, state="readonly")
+        self.filter_dupes_check = tk.Checkbutton(self.row1_frame, variable=self.filter_dupes_var, text="Filter duplicates?", command=self.on_filter_dupes_change, font=self.font_small)
+        self.tolerance_label = tk.Label(self.row1_frame, text="Tolerance", font=self.font_small, state="disabled")
+        self.tolerance_scale = ttk.Scale(self.row1_frame, variable=self.tolerance_var, from_=0, to=10, length=125, command=lambda _: self.on_tolerance_change(), state="disabled")
+        self.tolerance_number_label = tk.Label(self.row1_frame, text="0.5", font=self.font_small, state="disabled")
+        self.confirm_label = tk.Label(self.row1_frame, text="Confirm", font=self.font_small, state="disabled")
+        self.confirm_combobox = ttk.Combobox(self.row1_frame, values=["None", "pHash", "wHash"], width=6, font=self.font_small, state="disabled")
+        self.library_check = tk.Checkbutton(self.row1_frame, variable=self.library_var, text="Check library?", font=self.font_small, state="disabled")
+
+        # --- Row 2 ---
+        self.exts_label = tk.Label(self, text="Extension", font=self.font)
+        self.row2_frame = tk.Frame(self)
+        self.exts_combobox = ttk.Combobox(self.row2_frame, values=output_extensions(), width=5, font=self.font, state="readonly")
+        self.lossless_check = tk.Checkbutton(self.row2_frame, variable=self.lossless_var, text="Lossless?", font=self.font_small, state="disabled")
+        self.profile_label = tk.Label(self.row2_frame, text="Profile", font=self.font_small)
+        self.profile_combobox = ttk.Combobox(self.row2_frame, values=["Fast", "Balanced", "Smallest"], width=8, font=self.font_small, state="readonly")
+        self.raw_label = tk.Label(self.row2_frame, text="RAW", font=self.font_small)
+        self.raw_combobox = ttk.Combobox(self.row2_frame, values=["Full", "Fast", "Half", "Preview"], width=7, font=self.font_small, state="readonly")
+        self.raw16_check = tk.Checkbutton(self.row2_frame, variable=self.raw16_var, text="16-bit?", font=self.font_small)
+        self.workers_label = tk.Label(self.row2_frame, text="Workers", font=self.font_small)
+        self.workers_spinbox = ttk.Spinbox(self.row2_frame, textvariable=self.workers_var, from_=1, to=os.cpu_count() or 1, width=3, font=self.font_small, state="readonly")
+        self.memory_limit_label = tk.Label(self.row2_frame, text="Memory limit (MB)", font=self.font_small)
+        self.memory_limit_spinbox = ttk.Spinbox(self.row2_frame, textvariable=self.memory_limit_var, from_=256, to=65536, increment=256, width=6, font=self.font_small, state="readonly")
+        self.large_image_label = tk.Label(self.row2_frame, text="Strips above (MP)", font=self.font_small)
+        self.large_image_spinbox = ttk.Spinbox(self.row2_frame, textvariable=self.large_image_var, from_=0, to=10000, increment=25, width=5, font=self.font_small, state="readonly")
+        self.resume_check = tk.Checkbutton(self.row2_frame, variable=self.resume_var, text="Resume?", font=self.font_small)
+        self.trace_check = tk.Checkbutton(self.row2_frame, variable=self.trace_var, text="Write trace?", font=self.font_small)
+
+        # --- Row 3 ---
+        self.scan_label = tk.Label(self, text="Scan", font=self.font)
+        self.row3_frame = tk.Frame(self)
+        self.include_label = tk.Label(self.row3_frame, text="Include", font=self.font_small)
+        self.include_entry = ttk.Entry(self.row3_frame, textvariable=self.include_var, width=14, font=self.font_small)
+        self.exclude_label = tk.Label(self.row3_frame, text="Exclude", font=self.font_small)
+        self.exclude_entry = ttk.Entry(self.row3_frame, textvariable=self.exclude_var, width=14, font=self.font_small)
+        self.recursive_check = tk.Checkbutton(self.row3_frame, variable=self.recursive_var, text="Subfolders?", font=self.font_small)
+        self.sniff_check = tk.Checkbutton(self.row3_frame, variable=self.sniff_var, text="Check contents?", font=self.font_small)
+        self.watch_check = tk.Checkbutton(self.row3_frame, variable=self.watch_var, text="Keep watching?", font=self.font_small)
+        self.decode_cache_label = tk.Label(self.row3_frame, text="Decode cache (MB)", font=self.font_small)
+        self.decode_cache_spinbox = ttk.Spinbox(self.row3_frame, textvariable=self.decode_cache_var, from_=0, to=16384, increment=64, width=5, font=self.font_small, state="readonly")
+
+        # --- Row 4 ---
+        self.preview_label = tk.Label(self, text="Preview", font=self.font)
+        self.preview_frame = tk.Frame(self)
+        self.result_name_label = tk.Label(self.preview_frame, text="Image ", font=self.font_mono, bd=0, padx=0)
+        self.result_number_label = tk.Label(self.preview_frame, text="1", font=self.font_mono, bd=0, padx=0)
+        self.result_extension_label = tk.Label(self.preview_frame, text=".png", font=self.font_mono, bd=0, padx=0)
+
+    def _setup_binds(self):
+        """Sets up bindings for widgets."""
+        # Adds click-to-jump functionality for the tolerance scale
+        def jump_to_mouse(event: tk.Event):
+            self.tolerance_scale.event_generate('<Button-2>', x=event.x, y=event.y) # does exactly what right-click does
+            return "break" # stops the default "step" behavior
+        self.tolerance_scale.bind('<Button-1>', jump_to_mouse)
+
+        # Allows selecting an option in the extensions combobox to trigger on_extension_change()
+        self.exts_combobox.bind("<<ComboboxSelected>>", self.on_extension_change)
+
+    def _setup_layout(self):
+        """Places widgets using consistent grid layout for main rows, packs for sub-widgets."""
+        pad_opts = {'padx': 10, 'pady': 5, 'sticky': 'w'}
+        label_opts = {'sticky': 'e'}
+
+        # --- Row 0 ---
+        self.name_label.grid(row=0, column=0, **label_opts)
+        self.row0_frame.grid(row=0, column=1, columnspan=3, **pad_opts)
+        self.name_entry.pack(side="left")
+        self.space_check.pack(side="left", padx=(10, 0))
+        self.rename_check.pack(side="left", padx=(5, 0))
+        self.transfer_combobox.pack(side="left", padx=(5, 0))
+
+        # --- Row 1 ---
+        self.number_label.grid(row=1, column=0, **label_opts)
+        self.row1_frame.grid(row=1, column=1, columnspan=3, **pad_opts)
+        self.number_entry.pack(side="left")
+        self.sort_dims_label.pack(side="left", padx=(10, 0))
+        self.sort_dims_combobox.pack(side="left", padx=(5, 0))
+        self.filter_dupes_check.pack(side="left", padx=(10, 0))
+        self.tolerance_label.pack(side="left", padx=(5, 0))
+        self.tolerance_scale.pack(side="left")
+        self.tolerance_number_label.pack(side="left")
+        self.confirm_label.pack(side="left", padx=(5, 0))
+        self.confirm_combobox.pack(side="left", padx=(5, 0))
+        self.library_check.pack(side="left", padx=(5, 0))
+
+        # --- Row 2 ---
+        self.exts_label.grid(row=2, column=0, **label_opts)
+        self.row2_frame.grid(row=2, column=1, columnspan=3, **pad_opts)
+        self.exts_combobox.pack(side="left")
+        self.lossless_check.pack(side="left", padx=(5, 0))
+        self.profile_label.pack(side="left", padx=(10, 0))
+        self.profile_combobox.pack(side="left", padx=(5, 0))
+        self.raw_label.pack(side="left", padx=(10, 0))
+        self.raw_combobox.pack(side="left", padx=(5, 0))
+        self.raw16_check.pack(side="left", padx=(5, 0))
+        self.workers_label.pack(side="left", padx=(10, 0))
+        self.workers_spinbox.pack(side="left", padx=(5, 0))
+        self.memory_limit_label.pack(side="left", padx=(10, 0))
+        self.memory_limit_spinbox.pack(side="left", padx=(5, 0))
+        self.large_image_label.pack(side="left", padx=(10, 0))
+        self.large_image_spinbox.pack(side="left", padx=(5, 0))
+        self.resume_check.pack(side="left", padx=(10, 0))
+        self.trace_check.pack(side="left", padx=(5, 0))
+
+        # --- Row 3 ---
+        self.scan_label.grid(row=3, column=0, **label_opts)
+        self.row3_frame.grid(row=3, column=1, columnspan=3, **pad_opts)
+        self.include_label.pack(side="left")
+        self.include_entry.pack(side="left", padx=(5, 0))
+        self.exclude_label.pack(side="left", padx=(10, 0))
+        self.exclude_entry.pack(side="left", padx=(5, 0))
+        self.recursive_check.pack(side="left", padx=(10, 0))
+        self.sniff_check.pack(side="left", padx=(5, 0))
+        self.watch_check.pack(side="left", padx=(5, 0))
+        self.decode_cache_label.pack(side="left", padx=(10, 0))
+        self.decode_cache_spinbox.pack(side="left", padx=(5, 0))
+
+        # --- Row 4 ---
+        self.preview_label.grid(row=4, column=0, **label_opts)
+        self.preview_frame.grid(row=4, column=1, columnspan=3, **pad_opts)
+        self.result_name_label.pack(side="left")
+        self.result_number_label.pack(side="left")
+        self.result_extension_label.pack(side="left")
+
+    def validate_name(self, proposed: str) -> bool:
+        # Allow clearing the field
+        if proposed == "":
+            return True
+
+        # Disallow ASCII control characters (includes NUL)
+        if self._CTRL_CHARS_RE.search(proposed):
+            return False
+
+        # Disallow Windows-forbidden characters: < > : " / \ | ? *
+        if any(ch in proposed for ch in '<>:"/\\|?*'):
+            return False
+
+        # Disallow Windows reserved device names (case-insensitive), even with extension
+        base = proposed.split(".", 1)[0].strip().upper()
+        if base in self._WINDOWS_RESERVED:
+            return False
+
+        return True
+
+    def validate_number(self, input: str) -> bool:
+        if input.isdigit() or input == "":
+            return True
+        return False
+
+    def on_name_change(self, *args):
+        text = self.name_var.get()
+        if self.space_var.get():
+            display_text = f"{text} " if text else "Image "
+        else:
+            display_text = f"{text}" if text else "Image"
+        self.result_name_label.config(text=display_text)
+
+    def on_rename_change(self):
+        if self.rename_var.get():
+            self.exts_label.config(state="disabled")
+            self.exts_combobox.config(state="disabled")
+            self.lossless_check.config(state="disabled")
+            self.profile_label.config(state="disabled")
+            self.profile_combobox.config(state="disabled")
+            self.raw_label.config(state="disabled")
+            self.raw_combobox.config(state="disabled")
+            self.raw16_check.config(state="disabled")
+            self.transfer_combobox.config(state="readonly")
+            self.result_extension_label.config(text=".*")
+        else:
+            self.exts_label.config(state="normal")
+            self.exts_combobox.config(state="readonly")
+            self.lossless_check.config(state="normal" if self.exts_combobox.get() == ".webp" else "disabled")
+            self.profile_label.config(state="normal")
+            self.profile_combobox.config(state="readonly")
+            self.raw_label.config(state="normal")
+            self.raw_combobox.config(state="readonly")
+            self.raw16_check.config(state="normal" if self.exts_combobox.get() == ".png" else "disabled")
+            self.transfer_combobox.config(state="disabled")
+            self.result_extension_label.config(text=self.exts_combobox.get())
+
+    def on_number_change(self, *args):
+        num = self.number_var.get()
+        self.result_number_label.config(text=num if num else "1")
+
+    def on_filter_dupes_change(self):
+        if self.filter_dupes_var.get():
+            self.tolerance_label.config(state="normal")
+            self.tolerance_scale.config(state="enabled")
+            self.tolerance_number_label.config(state="normal")
+            self.confirm_label.config(state="normal")
+            self.confirm_combobox.config(state="readonly")
+            self.library_check.config(state="normal")
+        else:
+            self.tolerance_label.config(state="disabled")
+            self.tolerance_scale.config(state="disabled")
+            self.tolerance_number_label.config(state="disabled")
+            self.confirm_label.config(state="disabled")
+            self.confirm_combobox.config(state="disabled")
+            self.library_check.config(state="disabled")
+
+    def on_tolerance_change(self, _=None):
+        value = round(self.tolerance_var.get(), 1) # rounds to nearest 0.1
+        self.tolerance_var.set(value)
+        self.tolerance_number_label.config(text=f"{value:.1f}")
+
+    def on_extension_change(self, *args):
+        self.result_extension_label.config(text=self.exts_combobox.get())
+        self.lossless_check.config(state="normal" if self.exts_combobox.get() == ".webp" else "disabled") # Only WebP has a lossless mode
+        self.raw16_check.config(state="normal" if self.exts_combobox.get() == ".png" else "disabled") # Only PNG keeps 16 bits per channel
+
+    def get_values(self) -> Dict[str, Any]:
+        return {
+            'name': self.name_entry.get(),
+            'number': self.number_entry.get(),
+            'extension': self.exts_combobox.get(),
+            'presume_space': self.space_var.get(),
+            'rename_only': self.rename_var.get(),
+            'dimension': self.sort_dims_combobox.get(),
+            'filter_dupes': self.filter_dupes_var.get(),
+            'tolerance': self.tolerance_var.get(),
+            'confirm_hash': self.confirm_combobox.get(),
+            'check_library': self.library_var.get(),
+            'workers': self.workers_var.get(),
+            'memory_limit': self.memory_limit_var.get(),
+            'decode_cache': self.decode_cache_var.get(),
+            'large_image_mp': self.large_image_var.get(),
+            'resume': self.resume_var.get(),
+            'transfer': self.transfer_combobox.get(),
+            'trace': self.trace_var.get(),
+            'profile': self.profile_combobox.get(),
+            'lossless': self.lossless_var.get(),
+            'raw_preset': self.raw_combobox.get(),
+            'raw_bits': 16 if self.raw16_var.get() else 8,
+            'include': self.include_var.get(),
+            'exclude': self.exclude_var.get(),
+            'recursive': self.recursive_var.get(),
+            'sniff': self.sniff_var.get(),
+            'watch': self.watch_var.get()
+        }
+    
+
+class Main:
+    """Tk front end: collects options from InputPanel and runs a Pipeline on a worker thread."""
+    def __init__(self, root: tk.Tk):
+        self.root = root
+        self.pipeline = Pipeline()
+
+        self.root.title("ImageFlow")
+        self.root.geometry("1060x520")
+
+        # Creates widgets
+        top = tk.Frame(root, height=0) # Placeholder
+        self.input_panel = InputPanel(root)
+        self.convert_button = tk.Button(root, text="Convert", command=self.convert_command, width=40, font=('Arial', 12))
+        self.stop_button = tk.Button(root, text="Stop watching", command=self.stop_command, width=40, font=('Arial', 10), state="disabled")
+        self.progress_bar = ttk.Progressbar(root, mode='determinate', length=440)
+        self.status_label = tk.Label(root, text="", font=('Arial', 10))
+        bottom = tk.Frame(root, height=0) # Placeholder
+
+        # Packs widgets
+        top.pack(expand=True)
+        self.input_panel.pack(anchor='w')
+        self.convert_button.pack(anchor='center')
+        self.stop_button.pack(anchor='center', pady=(5, 0))
+        self.progress_bar.pack(anchor='center', pady=(10, 0))
+        self.status_label.pack(anchor='center')
+        bottom.pack(expand=True)
+
+        # Live progress from the worker thread
+        self._last_progress_update = 0.0
+        self.pipeline.metrics_listeners.append(self._on_metrics_event)
+        self.stop_event = threading.Event()
+
+    def _iter_togglables(self) -> list[tk.Misc]:
+        """Helper function that returns all widgets in InputPanel."""
+        return [
+            self.input_panel.name_label,
+            self.input_panel.name_entry,
+            self.input_panel.space_check,
+            self.input_panel.rename_check,
+            self.input_panel.transfer_combobox,
+            self.input_panel.number_label,
+            self.input_panel.number_entry,
+            self.input_panel.sort_dims_label,
+            self.input_panel.sort_dims_combobox,
+            self.input_panel.filter_dupes_check,
+            self.input_panel.tolerance_label,
+            self.input_panel.tolerance_scale,
+            self.input_panel.tolerance_number_label,
+            self.input_panel.confirm_label,
+            self.input_panel.confirm_combobox,
+            self.input_panel.library_check,
+            self.input_panel.exts_label,
+            self.input_panel.exts_combobox,
+            self.input_panel.lossless_check,
+            self.input_panel.profile_label,
+            self.input_panel.profile_combobox,
+            self.input_panel.raw_label,
+            self.input_panel.raw_combobox,
+            self.input_panel.raw16_check,
+            self.input_panel.workers_label,
+            self.input_panel.workers_spinbox,
+            self.input_panel.memory_limit_label,
+            self.input_panel.memory_limit_spinbox,
+            self.input_panel.large_image_label,
+            self.input_panel.large_image_spinbox,
+            self.input_panel.resume_check,
+            self.input_panel.trace_check,
+            self.input_panel.scan_label,
+            self.input_panel.include_label,
+            self.input_panel.include_entry,
+            self.input_panel.exclude_label,
+            self.input_panel.exclude_entry,
+            self.input_panel.recursive_check,
+            self.input_panel.sniff_check,
+            self.input_panel.watch_check,
+            self.input_panel.decode_cache_label,
+            self.input_panel.decode_cache_spinbox,
+            self.input_panel.preview_label,
+            self.input_panel.result_name_label,
+            self.input_panel.result_number_label,
+            self.input_panel.result_extension_label,
+            self.convert_button,
+        ]
+
+    def disable_elements(self):
+        # Snapshots current states for each widget, then disables
+        self._prev_states = {w: w.cget("state") for w in self._iter_togglables()}
+        for w in self._iter_togglables():
+            w.config(state="disabled")
+
+    def restore_elements(self):
+        # Restores each widget's previous state
+        for w, st in getattr(self, "_prev_states", {}).items():
+            w.config(state=st)
+
+    def convert_command(self):
+        # Parses input values
+        self.pipeline.configure(self.input_panel.get_values())
+
+        # Runs the command
+        self.disable_elements()
+        self.stop_event.clear()
+        if self.pipeline.watch:
+            self.stop_button.config(state="normal")
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop_command(self):
+        self.stop_button.config(state="disabled")
+        self.stop_event.set()
+
+    def run(self):
+        try:
+            self.pipeline.run(self.stop_event)
+        finally:
+            self.root.after(0, self.restore_elements)
+            self.root.after(0, lambda: self.stop_button.config(state="disabled"))
+
+    def _on_metrics_event(self, event: Dict[str, Any]):
+        """Forwards metrics events from worker threads to the Tk thread, at most ten progress updates a second."""
+        if event['type'] == 'stage_start':
+            self.root.after(0, lambda: self.status_label.config(text=f"{event['stage'].capitalize()}..."))
+        elif event['type'] == 'progress':
+            now = time.perf_counter()
+            if event['done'] < event['total'] and now - self._last_progress_update < 0.1:
+                return
+            self._last_progress_update = now
+            self.root.after(0, self._show_progress, event)
+
+    def _show_progress(self, progress: Dict[str, Any]):
+        self.progress_bar.config(maximum=max(progress['total'], 1), value=progress['done'])
+        text = f"{progress['stage'].capitalize()}: {progress['done']}/{progress['total']}"
+        text += f" \u00b7 {progress['files_per_s']:.1f} files/s \u00b7 {progress['bytes_per_s'] / (1024 * 1024):.1f} MB/s"
+        if progress['eta_s'] is not None and progress['done'] < progress['total']:
+            minutes, seconds = divmod(int(progress['eta_s']), 60)
+            text += f" \u00b7 ETA {minutes}:{seconds:02d}"
+        self.status_label.config(text=text)
+
+def open_window():
+    """Opens the ImageFlow window and returns once it is closed."""
+    root = tk.Tk()
+    Main(root)
+    root.mainloop()
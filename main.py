@@ -1,257 +1,1537 @@
-from collections import defaultdict
+from __future__ import annotations
+
+import argparse
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import functools
+import hashlib
+import io
+import json
 import itertools
+import math
+import multiprocessing
 import os
 from pathlib import Path
 import re
+import select
 import shutil
+import socket
+import sqlite3
+import struct
+import sys
 import threading
-import tkinter as tk
-from tkinter import ttk
-from typing import Any, Dict, Optional
-
-import imagehash
-import imageio
-from PIL import Image, ImageOps
-import rawpy
-
-class InputPanel(tk.Frame):
-    def __init__(self, master: Optional[tk.Widget]=None, **kwargs):
-        super().__init__(master, **kwargs)
-        
-        # Housekeeping
-        self._CTRL_CHARS_RE = re.compile(r"[\x00-\x1F]") # ASCII control chars 0x00–0x1F (NUL through Unit Separator)
-        self._WINDOWS_RESERVED = {
-            "CON", "PRN", "AUX", "NUL",
-            *(f"COM{i}" for i in range(1, 10)),
-            *(f"LPT{i}" for i in range(1, 10))
-        }
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+import zlib
 
-        # Configuration
-        self.font = ('Arial', 12)
-        self.font_small = ('Arial', 10)
-        self.font_mono = ('Courier New', 12)
+import numpy as np
+from PIL import Image, ImageFile, ImageOps, features
 
-        # Variables
-        self._init_variables()
+# rawpy and imagehash are imported by the stages that need them, so startup stays fast and
+# a run that never touches a RAW file or a duplicate check never loads them
+if TYPE_CHECKING:
+    import imagehash
 
-        # UI Setup
-        self._create_widgets()
-        self._setup_binds()
-        self._setup_layout()
+RAW_EXTENSIONS = {'.arw', '.nef'}
+RAW_FLIP_TO_ORIENTATION = {0: 1, 3: 3, 5: 8, 6: 6} # LibRaw's sizes.flip to the matching EXIF orientation
 
-        # Sets defaults
-        self.sort_dims_combobox.current(0) # None
-        self.exts_combobox.current(0) # .png
-        self.name_entry.focus()
-    
-    def _init_variables(self):
-        """Initializes Tkinter variables and traces."""
-        self.name_var = tk.StringVar()
-        self.name_var.trace_add("write", self.on_name_change)
+class ImageMeta(NamedTuple):
+    """Header-level facts about one input file, read once per run."""
+    size: int # bytes on disk
+    width: int # as stored, before EXIF rotation
+    height: int
+    format: Optional[str] # Pillow format name, 'RAW' for camera RAW files, None if unreadable
+    orientation: int # EXIF orientation tag, 1 when absent
 
-        self.number_var = tk.StringVar()
-        self.number_var.trace_add("write", self.on_number_change)
+    @property
+    def upright_size(self) -> tuple[int, int]:
+        """Width and height as displayed, which EXIF orientations 5 to 8 swap; converted images come out this way."""
+        return (self.height, self.width) if self.orientation in (5, 6, 7, 8) else (self.width, self.height)
 
-        self.space_var = tk.BooleanVar(value=True)
+def read_metadata(src: Path, size: Optional[int]=None) -> ImageMeta:
+    """Reads an image's dimensions, format and orientation from its header without decoding pixels."""
+    size = src.stat().st_size if size is None else size
+    if src.suffix.lower() in RAW_EXTENSIONS:
+        import rawpy
+        with rawpy.imread(str(src)) as raw: # Only parses the container; nothing is unpacked until postprocess
+            sizes = raw.sizes
+            return ImageMeta(size, sizes.width, sizes.height, 'RAW', RAW_FLIP_TO_ORIENTATION.get(sizes.flip, 1))
+    with Image.open(src) as img:
+        if img.format == 'PNG': # PNG's getexif() decodes the whole image when eXIf comes after the pixel data
+            exif = Image.Exif()
+            if 'exif' in img.info:
+                exif.load(img.info['exif'])
+        else:
+            exif = img.getexif()
+        return ImageMeta(size, img.width, img.height, img.format, exif.get(0x0112, 1))
 
-        self.rename_var = tk.BooleanVar(value=False)
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp'} | RAW_EXTENSIONS # Trusted when content sniffing is off
+MAGIC_NUMBERS = [
+    # (offset, signature, format) checked against the first bytes of each file
+    (0, b'\xff\xd8\xff', 'JPEG'),
+    (0, b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (8, b'WEBP', 'WEBP'), # After the RIFF header and chunk size
+    (0, b'GIF8', 'GIF'),
+    (0, b'BM', 'BMP'),
+    (0, b'II*\x00', 'TIFF'), # Also the container of most camera RAW formats (ARW, NEF, DNG, CR2, ...)
+    (0, b'MM\x00*', 'TIFF'),
+    (4, b'ftypavif', 'AVIF'),
+]
+SNIFF_BYTES = 16
+TIFF_EXTENSIONS = {'.tif', '.tiff'}
 
-        self.filter_dupes_var = tk.BooleanVar(value=False)
+class ScanEntry(NamedTuple):
+    path: str # Relative to the scanned folder, '/'-separated
+    size: int
+    mtime_ns: int
 
-        self.tolerance_var = tk.DoubleVar(value=5.0)
-    
-    def _create_widgets(self):
-        """Initializes all widgets."""
-        # Validation variables
-        name_vc = (self.register(self.validate_name), '%P')
-        number_vc = (self.register(self.validate_number), '%P')
-        
-        # --- Row 0 ---
-        self.name_label = tk.Label(self, text="Image name", font=self.font)
-        self.row0_frame = tk.Frame(self)
-        self.name_entry = ttk.Entry(self.row0_frame, textvariable=self.name_var, validate="key", validatecommand=name_vc, width=22, font=self.font)
-        self.space_check = tk.Checkbutton(self.row0_frame, variable=self.space_var, text="Presume space?", command=self.on_name_change, font=self.font_small)
-        self.rename_check = tk.Checkbutton(self.row0_frame, variable=self.rename_var, text="Rename only?", command=self.on_rename_change, font=self.font_small)
-
-        # --- Row 1 ---
-        self.number_label = tk.Label(self, text="Starting number", font=self.font)
-        self.row1_frame = tk.Frame(self)
-        self.number_entry = ttk.Entry(self.row1_frame, textvariable=self.number_var, validate="key", validatecommand=number_vc, width=4, font=self.font)
-        self.sort_dims_label = tk.Label(self.row1_frame, text="Sort dimension", font=self.font_small)
-        self.sort_dims_combobox = ttk.Combobox(self.row1_frame, values=["None", "Width", "Height"], width=6, font=self.font_small, state="readonly")
-        self.filter_dupes_check = tk.Checkbutton(self.row1_frame, variable=self.filter_dupes_var, text="Filter duplicates?", command=self.on_filter_dupes_change, font=self.font_small)
-        self.tolerance_label = tk.Label(self.row1_frame, text="Tolerance", font=self.font_small, state="disabled")
-        self.tolerance_scale = ttk.Scale(self.row1_frame, variable=self.tolerance_var, from_=0, to=10, length=125, command=lambda _: self.on_tolerance_change(), state="disabled")
-        self.tolerance_number_label = tk.Label(self.row1_frame, text="0.5", font=self.font_small, state="disabled")
-        
-        # --- Row 2 ---
-        self.exts_label = tk.Label(self, text="Extension", font=self.font)
-        self.exts_combobox = ttk.Combobox(self, values=[".png", ".jpeg"], width=4, font=self.font, state="readonly")
-
-        # --- Row 3 ---
-        self.preview_label = tk.Label(self, text="Preview", font=self.font)
-        self.preview_frame = tk.Frame(self)
-        self.result_name_label = tk.Label(self.preview_frame, text="Image ", font=self.font_mono, bd=0, padx=0)
-        self.result_number_label = tk.Label(self.preview_frame, text="1", font=self.font_mono, bd=0, padx=0)
-        self.result_extension_label = tk.Label(self.preview_frame, text=".png", font=self.font_mono, bd=0, padx=0)
-    
-    def _setup_binds(self):
-        """Sets up bindings for widgets."""
-        # Adds click-to-jump functionality for the tolerance scale
-        def jump_to_mouse(event: tk.Event):
-            self.tolerance_scale.event_generate('<Button-2>', x=event.x, y=event.y) # does exactly what right-click does
-            return "break" # stops the default "step" behavior
-        self.tolerance_scale.bind('<Button-1>', jump_to_mouse)
-
-        # Allows selecting an option in the extensions combobox to trigger on_extension_change()
-        self.exts_combobox.bind("<<ComboboxSelected>>", self.on_extension_change)
-
-    def _setup_layout(self):
-        """Places widgets using consistent grid layout for main rows, packs for sub-widgets."""
-        pad_opts = {'padx': 10, 'pady': 5, 'sticky': 'w'}
-        label_opts = {'sticky': 'e'}
-        
-        # --- Row 0 ---
-        self.name_label.grid(row=0, column=0, **label_opts)
-        self.row0_frame.grid(row=0, column=1, columnspan=3, **pad_opts)
-        self.name_entry.pack(side="left")
-        self.space_check.pack(side="left", padx=(10, 0))
-        self.rename_check.pack(side="left", padx=(5, 0))
-
-        # --- Row 1 ---
-        self.number_label.grid(row=1, column=0, **label_opts)
-        self.row1_frame.grid(row=1, column=1, columnspan=3, **pad_opts)
-        self.number_entry.pack(side="left")
-        self.sort_dims_label.pack(side="left", padx=(10, 0))
-        self.sort_dims_combobox.pack(side="left", padx=(5, 0))
-        self.filter_dupes_check.pack(side="left", padx=(10, 0))
-        self.tolerance_label.pack(side="left", padx=(5, 0))
-        self.tolerance_scale.pack(side="left")
-        self.tolerance_number_label.pack(side="left")
-
-        # --- Row 2 ---
-        self.exts_label.grid(row=2, column=0, **label_opts)
-        self.exts_combobox.grid(row=2, column=1, **pad_opts)
-        
-        # --- Row 3 ---
-        self.preview_label.grid(row=3, column=0, **label_opts)
-        self.preview_frame.grid(row=3, column=1, columnspan=3, **pad_opts)
-        self.result_name_label.pack(side="left")
-        self.result_number_label.pack(side="left")
-        self.result_extension_label.pack(side="left")
-    
-    def validate_name(self, proposed: str) -> bool:
-        # Allow clearing the field
-        if proposed == "":
-            return True
+def sniff_format(header: bytes, suffix: str) -> Optional[str]:
+    """Identifies an image format from a file's first bytes, or returns None if it is not an image ImageFlow reads.
 
-        # Disallow ASCII control characters (includes NUL)
-        if self._CTRL_CHARS_RE.search(proposed):
-            return False
+    A TIFF container only counts as a TIFF under a TIFF suffix, and as RAW under a suffix in
+    RAW_EXTENSIONS. Any other suffix is most likely a RAW format ImageFlow doesn't develop, which Pillow
+    would read as its small embedded preview, so it is skipped.
+    """
+    for offset, signature, image_format in MAGIC_NUMBERS:
+        if header[offset:offset + len(signature)] == signature:
+            if image_format == 'TIFF':
+                return 'RAW' if suffix in RAW_EXTENSIONS else 'TIFF' if suffix in TIFF_EXTENSIONS else None
+            if image_format == 'AVIF' and not features.check('avif'):
+                return None
+            return image_format
+    return None
 
-        # Disallow Windows-forbidden characters: < > : " / \ | ? *
-        if any(ch in proposed for ch in '<>:"/\\|?*'):
-            return False
+def _glob_matcher(patterns: list[str]) -> Callable[[str, str], bool]:
+    """Compiles case-insensitive globs into one test of (relative path, name).
 
-        # Disallow Windows reserved device names (case-insensitive), even with extension
-        base = proposed.split(".", 1)[0].strip().upper()
-        if base in self._WINDOWS_RESERVED:
-            return False
+    Patterns containing a slash match the relative path; all others match the name alone, like .gitignore.
+    """
+    def compile_any(globs: list[str]) -> Optional[re.Pattern]:
+        return re.compile('|'.join(fnmatch.translate(glob) for glob in globs), re.IGNORECASE) if globs else None
+    by_path = compile_any([pattern for pattern in patterns if '/' in pattern])
+    by_name = compile_any([pattern for pattern in patterns if '/' not in pattern])
+    def matches(relative: str, name: str) -> bool:
+        return bool(by_name and by_name.match(name) or by_path and by_path.match(relative))
+    return matches
 
-        return True
-    
-    def validate_number(self, input: str) -> bool:
-        if input.isdigit() or input == "":
-            return True
-        return False
-    
-    def on_name_change(self, *args):
-        text = self.name_var.get()
-        if self.space_var.get():
-            display_text = f"{text} " if text else "Image "
+def _sniff_file(path: str, suffix: str) -> Optional[str]:
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0)) # Skips the buffered file object
+    try:
+        return sniff_format(os.read(fd, SNIFF_BYTES), suffix)
+    finally:
+        os.close(fd)
+
+def scan_images(root: Path, include: Optional[list[str]]=None, exclude: Optional[list[str]]=None, recursive: bool=True,
+                sniff: bool=True, skip_dirs: Optional[list[Path]]=None) -> Iterator[ScanEntry]:
+    """Streams the images under root from a single os.scandir pass, one stat per file and no stat per folder.
+
+    Include globs pick files; exclude globs drop both files and whole folders. With `sniff`, a file's
+    first bytes decide whether it is an image, so misnamed files are found and stray ones skipped;
+    without it, the suffix must be in IMAGE_EXTENSIONS. Folders in `skip_dirs` (for example an output
+    folder inside the input folder) are never entered, and symlinked folders are not followed.
+    """
+    included = _glob_matcher(include) if include and include != ['*'] else lambda relative, name: True
+    excluded = _glob_matcher(exclude or [])
+    skipped = {os.path.abspath(path) for path in skip_dirs or []}
+    stack = [(str(root), '')]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = []
+                for entry in entries:
+                    relative = prefix + entry.name
+                    if excluded(relative, entry.name):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False): # Answered from the directory listing on most file systems
+                            if recursive and os.path.abspath(entry.path) not in skipped:
+                                subdirs.append((entry.path, relative + '/'))
+                            continue
+                        if not entry.is_file() or not included(relative, entry.name):
+                            continue
+                        suffix = os.path.splitext(entry.name)[1].lower()
+                        if sniff and _sniff_file(entry.path, suffix) is None or not sniff and suffix not in IMAGE_EXTENSIONS:
+                            continue
+                        stat = entry.stat() # Cached on the DirEntry; free on Windows, one stat elsewhere
+                        yield ScanEntry(relative, stat.st_size, stat.st_mtime_ns)
+                    except OSError: # Vanished or unreadable since the listing
+                        continue
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs)) # Depth-first, in listing order
+
+def scan_file(root: Path, relative: str, include: Optional[list[str]]=None, exclude: Optional[list[str]]=None,
+              sniff: bool=True) -> Optional[ScanEntry]:
+    """Applies scan_images' rules to one file, given by its '/'-separated path under root; None if it would be skipped."""
+    parts = relative.split('/')
+    excluded = _glob_matcher(exclude or [])
+    if any(excluded('/'.join(parts[:i + 1]), part) for i, part in enumerate(parts)):
+        return None
+    if include and include != ['*'] and not _glob_matcher(include)(relative, parts[-1]):
+        return None
+    path = os.path.join(root, *parts)
+    suffix = os.path.splitext(parts[-1])[1].lower()
+    try:
+        if sniff and _sniff_file(path, suffix) is None or not sniff and suffix not in IMAGE_EXTENSIONS:
+            return None
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return ScanEntry(relative, stat.st_size, stat.st_mtime_ns)
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify, watching a folder tree for files being created, written or moved in."""
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT = struct.Struct('iIII') # wd, mask, cookie, length of the name that follows
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {} # watch descriptor -> folder path
+
+    def add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}") # ENOSPC when out of watches
+        self._dirs[wd] = directory
+
+    def read(self, timeout: float) -> list[tuple[str, int]]:
+        """Waits up to timeout seconds and returns (path, mask) for every event since the last read."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            name = data[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b'\0')
+            offset += self.EVENT.size + length
+            directory = self._dirs.get(wd)
+            if mask & self.IN_Q_OVERFLOW:
+                events.append(('', mask))
+            elif directory is not None and name:
+                events.append((os.path.join(directory, os.fsdecode(name)), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    """Reports files that appear or change under a folder, once they have stopped growing.
+
+    Uses inotify on Linux and falls back to rescanning every `poll_interval` seconds elsewhere, or when
+    inotify is unavailable or out of watches. Either way a file is only reported after its size and
+    mtime have held still for `settle` seconds, so half-written files from a tethering app or a card
+    copy are never picked up. Files present when the watcher starts are not reported.
+    """
+    def __init__(self, root: Path, recursive: bool=True, settle: float=0.3, poll_interval: float=1.0, skip_dirs: Optional[list[Path]]=None):
+        self.root = str(root)
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self._skipped = {os.path.abspath(path) for path in skip_dirs or []}
+        self._pending = {} # path -> (size, mtime_ns, perf_counter() time of the last change)
+        self._known = {} # path -> (size, mtime_ns), only kept when polling
+        self._last_scan = 0.0
+        self._inotify = None
+        if sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify()
+                for directory in self._walk_dirs(self.root):
+                    self._inotify.add_watch(directory)
+            except (OSError, AttributeError): # No inotify in this libc, or the per-user watch limit was hit
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+        if self._inotify is None:
+            self._known = dict(self._walk_files(self.root))
+            self._last_scan = time.perf_counter()
+        self.mode = 'inotify' if self._inotify is not None else 'polling'
+
+    def _walk_dirs(self, top: str) -> Iterator[str]:
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            yield directory
+            if not self.recursive:
+                continue
+            try:
+                with os.scandir(directory) as entries:
+                    stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False) and os.path.abspath(entry.path) not in self._skipped)
+            except OSError:
+                continue
+
+    def _walk_files(self, top: str) -> Iterator[tuple[str, tuple[int, int]]]:
+        for directory in self._walk_dirs(top):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            yield entry.path, (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+
+    def _saw(self, path: str, now: float):
+        if path not in self._pending:
+            self._pending[path] = (-1, -1, now) # Stat'ed on the next stability check
+
+    def _collect_events(self, timeout: float, now: float):
+        for path, mask in self._inotify.read(timeout):
+            if mask & _Inotify.IN_Q_OVERFLOW: # Events were dropped, so every file is suspect
+                for file_path, _ in self._walk_files(self.root):
+                    self._saw(file_path, now)
+            elif mask & _Inotify.IN_ISDIR:
+                if self.recursive and os.path.abspath(path) not in self._skipped:
+                    # Files can land in a new folder before its watch exists, so its contents are picked up by hand
+                    for directory in self._walk_dirs(path):
+                        try:
+                            self._inotify.add_watch(directory)
+                        except OSError:
+                            pass
+                    for file_path, _ in self._walk_files(path):
+                        self._saw(file_path, now)
+            else:
+                self._saw(path, now)
+
+    def _rescan(self, now: float):
+        current = dict(self._walk_files(self.root))
+        for path, identity in current.items():
+            if self._known.get(path) != identity:
+                self._saw(path, now)
+        self._known = current
+        self._last_scan = now
+
+    def poll(self, timeout: float=0.1) -> list[tuple[str, float]]:
+        """Waits up to timeout seconds for changes and returns (path, landed) for every file that has settled.
+
+        `landed` is the perf_counter() time the file was last seen changing, i.e. when it finished arriving.
+        """
+        now = time.perf_counter()
+        if self._inotify is not None:
+            self._collect_events(timeout, now)
         else:
-            display_text = f"{text}" if text else "Image"
-        self.result_name_label.config(text=display_text)
-    
-    def on_rename_change(self):
-        if self.rename_var.get():
-            self.exts_label.config(state="disabled")
-            self.exts_combobox.config(state="disabled")
-            self.result_extension_label.config(text=".*")
+            if now - self._last_scan >= self.poll_interval:
+                self._rescan(now)
+            time.sleep(timeout)
+        now = time.perf_counter()
+
+        ready = []
+        for path, (size, mtime_ns, last_change) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError: # Deleted or moved away before it settled
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - last_change >= self.settle:
+                del self._pending[path]
+                ready.append((path, last_change))
+        return ready
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+
+ANALYSIS_SIZE = 256 # Shortest side, in pixels, that analysis decodes are allowed to shrink to
+ANALYSIS_MAX_DISTANCE = 4 # Worst dhash drift from a full-resolution decode measured by benchmarks/bench_hashing.py; not a guarantee
+UNREDUCIBLE_MODES = {'1', 'P', 'PA', 'I;16', 'I;16L', 'I;16B', 'I;16N'} # reduce() rejects these, or would average palette indices
+
+def _reduce_for_analysis(img: Image.Image, min_size: int) -> Image.Image:
+    factor = min(img.size) // min_size
+    if factor > 1:
+        if img.mode in UNREDUCIBLE_MODES: # Palette transparency only converts cleanly to RGBA
+            img = img.convert('RGBA' if img.mode in ('P', 'PA') else 'L')
+        img = img.reduce(factor)
+    return img
+
+def open_for_analysis(src: Path, source_format: Optional[str], min_size: int=ANALYSIS_SIZE) -> Image.Image:
+    """Decodes an image at reduced resolution for hashing and other analysis, never for output.
+
+    JPEGs are DCT-scaled by draft() while decoding, PNG and WebP are box-reduced right after decoding,
+    and RAW files use their embedded preview or, failing that, a half-size demosaic, reduced in turn.
+    Every path stops at or above `min_size` on the shortest side and keeps the stored (unrotated)
+    orientation. Modes reduce() can't average are converted to RGBA or L first; the hashes take L anyway.
+    The result never holds its source file open, so it can be cached while the file is moved.
+
+    Across 360 decodes of 1.9 to 24 MP JPEG, PNG and WebP images, a dhash of the result drifted at most
+    ANALYSIS_MAX_DISTANCE bits from the dhash of a full decode (0.2 to 0.3 bits on average), inside the
+    default duplicate tolerance. Smaller sizes drifted further.
+    """
+    if source_format == 'RAW':
+        import rawpy
+        with rawpy.imread(str(src)) as raw:
+            try:
+                thumb = raw.extract_thumb()
+            except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+                thumb = None
+            if thumb is not None and thumb.format == rawpy.ThumbFormat.JPEG:
+                img = Image.open(io.BytesIO(thumb.data))
+                img.draft('L', (min_size, min_size))
+                img.load()
+            elif thumb is not None and thumb.format == rawpy.ThumbFormat.BITMAP:
+                img = Image.fromarray(thumb.data)
+            else:
+                img = Image.fromarray(raw.postprocess(half_size=True, user_flip=0))
+        return _reduce_for_analysis(img, min_size)
+    with Image.open(src) as img:
+        if img.format == 'JPEG':
+            img.draft('L', (min_size, min_size)) # Decodes at 1/2, 1/4 or 1/8 scale straight to grayscale
+        img.load()
+        reduced = _reduce_for_analysis(img, min_size)
+        # Multi-frame images keep their file open after load(), so an unreduced one is detached from it
+        return reduced.copy() if reduced is img else reduced
+
+ENCODER_PROFILES = {
+    # Pillow save() options per output format. 'fast' trades size for encode time, 'smallest' the reverse.
+    # 'balanced' keeps Pillow's default PNG level and JPEG quality, so it matches earlier output.
+    'fast': {
+        'PNG': {'compress_level': 1},
+        'JPEG': {'quality': 75, 'subsampling': '4:2:0', 'optimize': False},
+        'WEBP': {'quality': 80, 'method': 0},
+        'WEBP_LOSSLESS': {'lossless': True, 'quality': 0, 'method': 0},
+        'AVIF': {'quality': 70, 'speed': 10},
+    },
+    'balanced': {
+        'PNG': {'compress_level': 6},
+        'JPEG': {'quality': 75, 'subsampling': '4:2:0', 'optimize': True},
+        'WEBP': {'quality': 90, 'method': 4},
+        'WEBP_LOSSLESS': {'lossless': True, 'quality': 70, 'method': 4},
+        'AVIF': {'quality': 80, 'speed': 6},
+    },
+    'smallest': {
+        'PNG': {'compress_level': 9, 'optimize': True},
+        'JPEG': {'quality': 70, 'subsampling': '4:2:0', 'optimize': True, 'progressive': True},
+        'WEBP': {'quality': 75, 'method': 6},
+        'WEBP_LOSSLESS': {'lossless': True, 'quality': 90, 'method': 5},
+        'AVIF': {'quality': 60, 'speed': 4},
+    },
+}
+ALPHA_FORMATS = {'PNG', 'WEBP', 'AVIF'} # Output formats that keep an alpha channel
+
+def output_extensions() -> list[str]:
+    """Extensions offered for conversion; AVIF only when this Pillow build can write it."""
+    extensions = [".png", ".jpeg", ".webp"]
+    if features.check('avif'):
+        extensions.append(".avif")
+    return extensions
+
+def encoder_options(extension: str, profile: str, lossless: bool=False) -> Dict[str, Any]:
+    """Pillow save() options for an output format under a named encoder profile."""
+    key = 'WEBP_LOSSLESS' if extension == 'WEBP' and lossless else extension
+    return dict(ENCODER_PROFILES[profile].get(key, {}))
+
+class DecodeCache:
+    """Thread-safe LRU cache of decoded images under a byte budget, so a file's pixels are produced once per run.
+
+    Keys are (filename, kind), where kind names the decode (e.g. 'analysis' for open_for_analysis).
+    Cached images are shared between callers, so nothing may modify them in place.
+    """
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.size = 0
+        self.peak = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _nbytes(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def get(self, key: tuple[str, str], decode: Callable[[], Image.Image]) -> Image.Image:
+        """Returns the cached image for key, calling decode() and caching its result on a miss."""
+        with self._lock:
+            img = self._images.get(key)
+            if img is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+        img = decode() # Outside the lock, so threads decode in parallel
+        nbytes = self._nbytes(img)
+        if nbytes <= self.budget:
+            with self._lock:
+                if key not in self._images:
+                    self._images[key] = img
+                    self.size += nbytes
+                    while self.size > self.budget:
+                        _, evicted = self._images.popitem(last=False)
+                        self.size -= self._nbytes(evicted)
+                        self.evictions += 1
+                    self.peak = max(self.peak, self.size)
+        return img
+
+    def discard(self, filename: str):
+        """Drops every cached decode of a file."""
+        with self._lock:
+            for key in [key for key in self._images if key[0] == filename]:
+                self.size -= self._nbytes(self._images.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"{self.hits} of {lookups} decodes reused ({rate:.0%}), {self.evictions} evicted, peak {self.peak / (1024 * 1024):.1f} MB"
+
+def flatten_and_convert(img: Image.Image, extension: str, image_mode: str) -> Image.Image:
+    """Flattens alpha onto white where the output format can't keep it, then converts to the output mode."""
+    if img.mode.endswith('A') and extension not in ALPHA_FORMATS: # Removes the alpha channel from the image
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    return img.convert(image_mode)
+
+class RawPreset(NamedTuple):
+    """How camera RAW files are developed for output, trading quality for speed."""
+    demosaic: Optional[str] # rawpy.DemosaicAlgorithm name, None for LibRaw's default (AHD)
+    half_size: bool # Merges each 2x2 Bayer block into one pixel, so there is nothing to interpolate
+    preview_scale: float # Takes the embedded preview instead when its long side is at least this fraction of the sensor's, 0 for never
+
+RAW_PRESETS = {
+    'full': RawPreset(None, False, 0), # LibRaw's defaults, as every RAW file was developed before presets
+    'fast': RawPreset('LINEAR', False, 0), # Bilinear interpolation, softer and with some colour fringing on fine detail
+    'half': RawPreset(None, True, 0),
+    'preview': RawPreset(None, True, 0.5), # Falls back to a half-size develop when the preview is smaller than that
+}
+RAW_BITS = [8, 16]
+
+def _raw_preview(raw, min_scale: float) -> Optional[Image.Image]:
+    """The RAW file's embedded preview turned upright, if it has one at least min_scale of the sensor's size."""
+    import rawpy
+    try:
+        thumb = raw.extract_thumb()
+    except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+        return None
+    if thumb.format == rawpy.ThumbFormat.JPEG:
+        img = Image.open(io.BytesIO(thumb.data))
+    elif thumb.format == rawpy.ThumbFormat.BITMAP:
+        img = Image.fromarray(thumb.data)
+    else:
+        return None
+    sizes = raw.sizes
+    if max(img.size) < min_scale * max(sizes.width, sizes.height):
+        return None
+    img = img.convert('RGB') # Also drops the preview's own EXIF, whose orientation cameras rarely fill in
+    method = EXIF_TRANSPOSE.get(RAW_FLIP_TO_ORIENTATION.get(sizes.flip, 1))
+    if method is not None and (img.width >= img.height) == (sizes.width >= sizes.height): # Unless the camera already rotated it
+        img = img.transpose(method)
+    return img
+
+def develop_raw(data: bytes, preset: str='full', bits: int=8) -> Image.Image | np.ndarray:
+    """Develops a camera RAW file upright under a preset.
+
+    Returns an 8-bit RGB image, or for 16 bits a uint16 RGB array, since Pillow has no 16-bit RGB mode.
+    An embedded preview is always 8-bit.
+    """
+    import rawpy
+    settings = RAW_PRESETS[preset]
+    with rawpy.imread(io.BytesIO(data)) as raw:
+        if settings.preview_scale and (preview := _raw_preview(raw, settings.preview_scale)) is not None:
+            return preview
+        options = {'half_size': settings.half_size, 'output_bps': bits} # LibRaw applies the camera's orientation itself
+        if settings.demosaic is not None:
+            options['demosaic_algorithm'] = rawpy.DemosaicAlgorithm[settings.demosaic]
+        rgb = raw.postprocess(**options)
+    return rgb if bits == 16 else Image.fromarray(rgb)
+
+def encode_png16(rgb: np.ndarray, image_mode: str, save_options: Optional[Dict[str, Any]]=None) -> bytes:
+    """Encodes a uint16 RGB array as a 16-bit PNG in the output mode, filtered and compressed as Pillow would an 8-bit one."""
+    if image_mode == 'RGBA':
+        rgb = np.dstack([rgb, np.full(rgb.shape[:2], 0xFFFF, dtype=np.uint16)])
+    output = io.BytesIO()
+    writer = PngStripWriter(output, (rgb.shape[1], rgb.shape[0]), image_mode, {}, save_options, bit_depth=16)
+    rows_per_strip = max(1, TILE_STRIP_BYTES // (rgb.shape[1] * writer.bpp))
+    for y0 in range(0, rgb.shape[0], rows_per_strip):
+        writer.write(rgb[y0:y0 + rows_per_strip])
+    writer.close()
+    return output.getvalue()
+
+def encode_image(data: bytes, extension: str, image_mode: str, source_format: Optional[str], save_options: Optional[Dict[str, Any]]=None,
+                 raw_preset: str='full', raw_bits: int=8) -> tuple[bytes, Dict[str, float]]:
+    """Decodes, transforms and re-encodes one image entirely in memory. Lives at module level so worker processes can run it.
+
+    RAW files are developed under raw_preset; 16-bit development only applies to PNG output, the one
+    format here that keeps it. Returns the encoded bytes and the seconds spent decoding, transforming and encoding.
+    """
+    timings = {}
+    start = time.perf_counter()
+    output = io.BytesIO()
+    if source_format == 'RAW': # Accounts for Sony and Nikon RAW formats
+        img = develop_raw(data, raw_preset, raw_bits if extension == 'PNG' else 8)
+        timings['decode'] = time.perf_counter() - start
+        if isinstance(img, np.ndarray):
+            timings['transform'] = 0.0
+            start = time.perf_counter()
+            encoded = encode_png16(img, image_mode, save_options)
+            timings['encode'] = time.perf_counter() - start
+            return encoded, timings
+        img = flatten_and_convert(img, extension, image_mode)
+    else: # All native image formats
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        timings['decode'] = time.perf_counter() - start
+        img = flatten_and_convert(ImageOps.exif_transpose(img), extension, image_mode) # Auto-rotates based on EXIF
+    timings['transform'] = time.perf_counter() - start - timings['decode']
+    start = time.perf_counter()
+    img.save(output, extension, **(save_options or {}))
+    timings['encode'] = time.perf_counter() - start
+    return output.getvalue(), timings
+
+def convert_image(src: Path, dst: Path, extension: str, image_mode: str, source_format: Optional[str], save_options: Optional[Dict[str, Any]]=None,
+                  raw_preset: str='full', raw_bits: int=8) -> Dict[str, float]:
+    """Converts one image file to another format, returning the seconds spent in each step."""
+    start = time.perf_counter()
+    data = src.read_bytes()
+    read_time = time.perf_counter() - start
+    encoded, timings = encode_image(data, extension, image_mode, source_format, save_options, raw_preset, raw_bits)
+    start = time.perf_counter()
+    dst.write_bytes(encoded)
+    return {'read': read_time, **timings, 'write': time.perf_counter() - start}
+
+TILED_FORMATS = {'PNG', 'JPEG'} # Output formats large-image mode can write
+PILLOW_MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS # Pillow's decompression-bomb limit, about 89 MP
+
+def set_pixel_limit(large_image_mp: int):
+    """Lifts Pillow's decompression-bomb limit while large-image mode is on, so gigapixel scans open at all.
+
+    With the mode off (0) Pillow's own limit applies, and larger images fail to open as before. Worker
+    processes call this too, since one started fresh doesn't inherit the setting.
+    """
+    Image.MAX_IMAGE_PIXELS = None if large_image_mp > 0 else PILLOW_MAX_IMAGE_PIXELS
+TILE_STRIP_BYTES = 1024 * 1024 # Output bytes per strip in large-image mode; filtering a strip needs about 25x that
+EXIF_TRANSPOSE = { # EXIF orientation to the transpose that undoes it, as ImageOps.exif_transpose applies them
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+def _strip_box(method: Optional[Image.Transpose], size: tuple[int, int], y0: int, y1: int) -> tuple[int, int, int, int]:
+    """The box of the stored image that becomes rows y0 to y1 of the upright image once transposed by method."""
+    width, height = size
+    if method in (None, Image.Transpose.FLIP_LEFT_RIGHT):
+        return (0, y0, width, y1)
+    if method in (Image.Transpose.FLIP_TOP_BOTTOM, Image.Transpose.ROTATE_180):
+        return (0, height - y1, width, height - y0)
+    if method in (Image.Transpose.TRANSPOSE, Image.Transpose.ROTATE_270): # Upright rows are stored columns
+        return (y0, 0, y1, height)
+    return (width - y1, 0, width - y0, height) # TRANSVERSE and ROTATE_90 take the columns from the right
+
+def _png_filter_rows(rows: np.ndarray, prior: np.ndarray, bpp: int, optimize: bool=False) -> np.ndarray:
+    """Filters raw PNG rows the way Pillow's encoder does, returning them with their filter type bytes prepended.
+
+    Each row gets whichever filter gives the lowest sum of its bytes read as signed. Ties go to the one
+    Pillow tries first: None, Up, Sub, Average (only with `optimize`), then Paeth. `prior` is the raw
+    row above the first one (zeros for the first strip).
+    """
+    up = np.vstack([prior[None], rows[:-1]])
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    upleft = np.zeros_like(rows)
+    upleft[:, bpp:] = up[:, :-bpp]
+    # Paeth picks whichever neighbour is closest to left + up - upleft, which needs signed arithmetic
+    vertical = up.astype(np.int16) - upleft # Distance of the estimate from left
+    horizontal = left.astype(np.int16) - upleft # ... from up
+    to_left, to_up, to_upleft = np.abs(vertical), np.abs(horizontal), np.abs(vertical + horizontal)
+    paeth = np.where((to_left <= to_up) & (to_left <= to_upleft), left, np.where(to_up <= to_upleft, up, upleft))
+    types = [0, 2, 1, 3, 4] if optimize else [0, 2, 1, 4]
+    predictions = {0: 0, 1: left, 2: up, 3: ((left.astype(np.int16) + up) >> 1).astype(np.uint8), 4: paeth}
+    candidates = np.stack([rows - predictions[filter_type] for filter_type in types]) # uint8 wraps around, as PNG's arithmetic does
+    # |byte as signed| is abs() in int8, where -128 wraps back to itself and so reads as 128 unsigned
+    choice = np.abs(candidates.view(np.int8)).view(np.uint8).sum(axis=2, dtype=np.int64).argmin(axis=0)
+    filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = np.array(types, dtype=np.uint8)[choice]
+    filtered[:, 1:] = candidates[choice, np.arange(rows.shape[0])]
+    return filtered
+
+class PngStripWriter:
+    """Writes an 8- or 16-bit RGB or RGBA PNG a strip of rows at a time, never holding the whole image.
+
+    Filtering, the zlib settings and the IDAT chunk size all follow Pillow's PNG encoder, so the file is
+    byte-identical to img.save() whenever Python's zlib is the same build as Pillow's (and pixel-identical
+    regardless). `info` supplies the ancillary chunks Pillow would take from img.info.
+    """
+    def __init__(self, f, size: tuple[int, int], mode: str, info: Dict[str, Any], save_options: Optional[Dict[str, Any]]=None, bit_depth: int=8):
+        save_options = save_options or {}
+        self.f = f
+        self.bit_depth = bit_depth
+        self.bpp = len(mode) * bit_depth // 8
+        self.prior = np.zeros(size[0] * self.bpp, dtype=np.uint8)
+        self.chunk_size = max(ImageFile.MAXBLOCK, size[0] * 4)
+        self.pending = bytearray()
+        self.optimize = bool(save_options.get('optimize'))
+        level = 9 if self.optimize else save_options.get('compress_level', -1)
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, zlib.Z_FILTERED)
+        f.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', size[0], size[1], bit_depth, 6 if mode == 'RGBA' else 2, 0, 0, 0))
+        if icc := save_options.get('icc_profile', info.get('icc_profile')):
+            self._chunk(b'iCCP', b'ICC Profile\0\0' + zlib.compress(icc))
+        transparency = info.get('transparency')
+        if mode == 'RGB' and isinstance(transparency, (list, tuple)) and len(transparency) == 3:
+            self._chunk(b'tRNS', struct.pack('>HHH', *transparency))
+
+    def _chunk(self, cid: bytes, data: bytes):
+        self.f.write(struct.pack('>I', len(data)) + cid + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(cid))))
+
+    def write(self, strip: Image.Image | np.ndarray):
+        """Appends a strip of rows, which must already be in the output mode and width; 16-bit ones as a uint16 array."""
+        rows = np.asarray(strip)
+        if self.bit_depth == 16:
+            rows = rows.astype('>u2').view(np.uint8) # PNG samples are big-endian
+        rows = rows.reshape(rows.shape[0], -1)
+        self.pending += self.compressor.compress(_png_filter_rows(rows, self.prior, self.bpp, self.optimize))
+        self.prior = rows[-1].copy()
+        self._flush(self.chunk_size)
+
+    def _flush(self, threshold: int):
+        while len(self.pending) >= threshold and self.pending:
+            self._chunk(b'IDAT', bytes(self.pending[:self.chunk_size]))
+            del self.pending[:self.chunk_size]
+
+    def close(self):
+        self.pending += self.compressor.flush()
+        self._flush(1)
+        self._chunk(b'IEND', b'')
+
+def convert_image_tiled(src: Path, dst: Path, extension: str, image_mode: str, source_format: Optional[str], save_options: Optional[Dict[str, Any]]=None) -> Dict[str, float]:
+    """Converts one large image to PNG or JPEG a strip at a time, with the same output as convert_image.
+
+    Pillow decodes the source whole, so one full source raster is always held; rotation, alpha flattening
+    and mode conversion add only a strip. PNG output is filtered and compressed strip by strip straight
+    into dst, so the peak is the decode plus a strip. JPEG output is pasted into a full output raster,
+    since Pillow's JPEG encoder needs the whole image, so its peak is about twice the raster; the source
+    is released before encoding. Returns the seconds per step.
+    """
+    timings = {}
+    start = time.perf_counter()
+    img = Image.open(src)
+    img.load()
+    timings['decode'] = time.perf_counter() - start
+    start = time.perf_counter()
+    method = EXIF_TRANSPOSE.get(img.getexif().get(0x0112, 1))
+    # The full-size path applied to one pixel yields the info (EXIF, ICC profile, transparency) it would save
+    info = flatten_and_convert(ImageOps.exif_transpose(img.crop((0, 0, 1, 1))), extension, image_mode).info
+    width, height = (img.height, img.width) if method in (Image.Transpose.TRANSPOSE, Image.Transpose.TRANSVERSE, Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270) else img.size
+    rows_per_strip = max(1, TILE_STRIP_BYTES // (width * len(image_mode)))
+    timings['transform'] = time.perf_counter() - start
+
+    def strips() -> Iterator[tuple[int, Image.Image]]:
+        for y0 in range(0, height, rows_per_strip):
+            strip_start = time.perf_counter()
+            strip = img.crop(_strip_box(method, img.size, y0, min(y0 + rows_per_strip, height)))
+            if method is not None:
+                strip = strip.transpose(method)
+            strip = flatten_and_convert(strip, extension, image_mode)
+            timings['transform'] += time.perf_counter() - strip_start
+            yield y0, strip
+
+    if extension == 'PNG':
+        start, setup = time.perf_counter(), timings['transform']
+        with open(dst, 'wb') as f:
+            writer = PngStripWriter(f, (width, height), image_mode, info, save_options)
+            for _, strip in strips():
+                writer.write(strip)
+            writer.close()
+        timings['encode'] = time.perf_counter() - start - (timings['transform'] - setup) # Less the strips' own transforms
+        return timings
+
+    if method is None and img.mode == image_mode: # Nothing to change, so the decode itself is what gets encoded
+        output = img
+    else:
+        output = Image.new(image_mode, (width, height))
+        for y0, strip in strips():
+            output.paste(strip, (0, y0))
+        img.close()
+        del img
+    output.info = info
+    start = time.perf_counter()
+    output.save(dst, extension, **(save_options or {}))
+    timings['encode'] = time.perf_counter() - start
+    return timings
+
+TRANSFER_STRATEGIES = ['copy', 'hardlink', 'reflink', 'move', 'auto']
+FICLONE = 0x40049409 # Linux ioctl that makes dst share src's extents (Btrfs, XFS, bcachefs, ...)
+
+def _reflink(src: Path, dst: Path):
+    """Clones a file copy-on-write, raising OSError where the platform or filesystem can't."""
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                dst.unlink()
+                raise
+    elif sys.platform == 'darwin': # APFS
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+    else:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+    shutil.copystat(src, dst)
+
+def transfer_file(src: Path, dst: Path, strategy: str) -> tuple[str, int]:
+    """Puts src's bytes at dst with the given strategy, falling back to a plain copy when it can't apply.
+
+    'auto' tries a reflink, then a hard link, then a copy. Returns the method actually used and how
+    many bytes had to be copied (zero for links, clones and same-device moves).
+    """
+    attempts = {'auto': ['reflink', 'hardlink'], 'copy': []}.get(strategy, [strategy])
+    for method in attempts:
+        try:
+            if dst.exists() or dst.is_symlink(): # Links and clones refuse to replace an existing file
+                dst.unlink()
+            if method == 'hardlink':
+                os.link(src, dst)
+            elif method == 'reflink':
+                _reflink(src, dst)
+            elif method == 'move':
+                os.replace(src, dst) # Atomic, but only within one filesystem
+            return method, 0
+        except OSError:
+            continue # Across devices, unsupported filesystem, no permission, ...
+    size = src.stat().st_size
+    if strategy == 'move':
+        shutil.move(src, dst)
+        return 'move', size
+    shutil.copy2(src, dst)
+    return 'copy', size
+
+def estimate_job_memory(meta: ImageMeta, tiled: bool=False) -> int:
+    """Rough peak bytes one conversion holds: the file, a few full-size rasters while transforming, and the output."""
+    if tiled: # The decode, at most one assembled JPEG, and a strip being filtered
+        return meta.width * meta.height * 4 * 2 + TILE_STRIP_BYTES * 25
+    if meta.format == 'RAW':
+        raster = meta.width * meta.height * (2 + 3 + 3) # 16-bit sensor data, demosaiced RGB, encoder copy
+    else:
+        raster = meta.width * meta.height * 4 * 3 # Decode, rotate and mode-convert copies at up to 4 bytes per pixel
+    return meta.size * 2 + raster
+
+class MemoryBudget:
+    """Caps the estimated bytes held by jobs in flight; acquiring blocks until the request fits.
+
+    A job bigger than the whole budget is still let through once nothing else is in flight,
+    so an oversized image slows the pipeline down instead of stalling it.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount: int):
+        with self._condition:
+            while self.used and self.used + amount > self.limit:
+                self._condition.wait()
+            self.used += amount
+
+    def release(self, amount: int):
+        with self._condition:
+            self.used -= amount
+            self._condition.notify_all()
+
+HASH_ALGORITHM = f'dhash/analysis-{ANALYSIS_SIZE}' # Hashes come from open_for_analysis, so the decode size is part of the key
+HASH_SIZE = 8 # 8x8 bits, i.e. one 64-bit integer per hash
+
+def hash_to_int(image_hash: imagehash.ImageHash) -> int:
+    """Packs an ImageHash into a plain integer so Hamming distance is a single XOR and popcount."""
+    return int(str(image_hash), 16)
+
+class HammingIndex:
+    """Multi-index hashing over fixed-width integer hashes for Hamming radius queries.
+
+    Hashes are split into bands. If two hashes are within the radius, then by the pigeonhole principle
+    at least one band differs by no more than radius // bands bits, so a query only has to probe those
+    band values instead of comparing against every stored hash. The band count is picked from the
+    radius and the expected number of hashes to keep both probes and false candidates low.
+    """
+    def __init__(self, radius: int, expected_size: int=1024, bits: int=64):
+        self.radius = radius
+        self.bits = bits
+        num_bands = self._choose_num_bands(radius, max(expected_size, 1), bits)
+        self._band_radius = radius // num_bands
+
+        # Splits the bits into bands whose widths differ by at most one
+        self._bands = [] # (shift, mask, probe flips)
+        shift = 0
+        for i in range(num_bands):
+            width = bits // num_bands + (1 if i < bits % num_bands else 0)
+            flips = [sum(1 << b for b in combo) for k in range(self._band_radius + 1) for combo in itertools.combinations(range(width), k)]
+            self._bands.append((shift, (1 << width) - 1, flips))
+            shift += width
+        self._tables = [defaultdict(list) for _ in self._bands]
+        self._hashes = []
+        self._items = []
+
+    @staticmethod
+    def _query_cost(num_bands: int, radius: int, expected_size: int, bits: int) -> float:
+        """Estimated probes plus candidate checks for one query against uniformly spread hashes."""
+        width = bits // num_bands
+        probes = num_bands * sum(math.comb(width, k) for k in range(radius // num_bands + 1))
+        return probes + probes * expected_size / (1 << width)
+
+    @staticmethod
+    def _choose_num_bands(radius: int, expected_size: int, bits: int) -> int:
+        """Picks the band count with the lowest estimated cost per query."""
+        candidates = range(1, min(radius + 1, bits) + 1)
+        return min(candidates, key=lambda num_bands: HammingIndex._query_cost(num_bands, radius, expected_size, bits))
+
+    @staticmethod
+    def estimated_query_cost(radius: int, expected_size: int, bits: int=64) -> float:
+        """Estimated Python-level work per query with the best band layout."""
+        num_bands = HammingIndex._choose_num_bands(radius, max(expected_size, 1), bits)
+        return HammingIndex._query_cost(num_bands, radius, max(expected_size, 1), bits)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, hash_value: int, item: Any):
+        """Inserts an item under its hash."""
+        index = len(self._items)
+        self._hashes.append(hash_value)
+        self._items.append(item)
+        for table, (shift, mask, _) in zip(self._tables, self._bands):
+            table[(hash_value >> shift) & mask].append(index)
+
+    def query(self, hash_value: int) -> list[tuple[Any, int]]:
+        """Returns (item, distance) for every stored item within the radius of the hash."""
+        seen = set()
+        results = []
+        for table, (shift, mask, flips) in zip(self._tables, self._bands):
+            key = (hash_value >> shift) & mask
+            for flip in flips:
+                for index in table.get(key ^ flip, ()):
+                    if index in seen:
+                        continue
+                    seen.add(index)
+                    distance = (self._hashes[index] ^ hash_value).bit_count()
+                    if distance <= self.radius:
+                        results.append((self._items[index], distance))
+        return results
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Counts set bits in every element of a uint64 array."""
+    if hasattr(np, 'bitwise_count'): # NumPy 2.0+
+        return np.bitwise_count(values)
+    counts = _POPCOUNT_TABLE[values.view(np.uint8)].reshape(*values.shape, 8)
+    return counts.sum(axis=-1, dtype=np.uint8)
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def hamming_pairs_matrix(hash_values: np.ndarray, radius: int, tile: int=2048):
+    """Yields (i, j) index arrays, i < j, of every pair within the radius.
+
+    Distances are computed as popcount(a XOR b) over tiles of the upper triangle of the distance
+    matrix, so memory stays at a few tile-sized arrays no matter how many hashes there are.
+    """
+    n = len(hash_values)
+    for row in range(0, n, tile):
+        block_a = hash_values[row:row + tile]
+        for col in range(row, n, tile):
+            block_b = hash_values[col:col + tile]
+            close = _popcount(block_a[:, None] ^ block_b[None, :]) <= radius
+            if row == col:
+                close = np.triu(close, k=1) # Drops self-matches and the mirrored lower half
+            i, j = np.nonzero(close)
+            if len(i):
+                yield i + row, j + col
+
+class HashCache:
+    """SQLite cache of perceptual hashes keyed by (path, size, mtime_ns, algorithm, hash size).
+
+    Rows for the requested algorithm are loaded up front and new hashes are written back in one
+    transaction on close, so lookups never touch the database one file at a time.
+    """
+    def __init__(self, db_path: Path, algorithm: str=HASH_ALGORITHM, hash_size: int=HASH_SIZE):
+        self.algorithm = algorithm
+        self.hash_size = hash_size
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "algorithm TEXT NOT NULL, hash_size INTEGER NOT NULL, hash TEXT NOT NULL, "
+            "PRIMARY KEY (path, size, mtime_ns, algorithm, hash_size))"
+        )
+        rows = self._conn.execute(
+            "SELECT path, size, mtime_ns, hash FROM hashes WHERE algorithm = ? AND hash_size = ?",
+            (algorithm, hash_size)
+        )
+        self._known = {(path, size, mtime_ns): hash_hex for path, size, mtime_ns, hash_hex in rows}
+        self._pending = []
+
+    def get(self, path: str, size: int, mtime_ns: int) -> Optional[str]:
+        """Returns the cached hash as hex, or None if the file is new or has changed."""
+        hash_hex = self._known.get((path, size, mtime_ns))
+        if hash_hex is None:
+            self.misses += 1
         else:
-            self.exts_label.config(state="normal")
-            self.exts_combobox.config(state="readonly")
-            self.result_extension_label.config(text=self.exts_combobox.get())
-    
-    def on_number_change(self, *args):
-        num = self.number_var.get()
-        self.result_number_label.config(text=num if num else "1")
-    
-    def on_filter_dupes_change(self):
-        if self.filter_dupes_var.get():
-            self.tolerance_label.config(state="normal")
-            self.tolerance_scale.config(state="enabled")
-            self.tolerance_number_label.config(state="normal")
+            self.hits += 1
+        return hash_hex
+
+    def put(self, path: str, size: int, mtime_ns: int, hash_hex: str):
+        self._known[(path, size, mtime_ns)] = hash_hex
+        self._pending.append((path, size, mtime_ns, self.algorithm, self.hash_size, hash_hex))
+
+    def prune(self, current: Dict[str, tuple[int, int]]) -> int:
+        """Deletes rows whose file has changed since it was hashed or no longer exists.
+
+        `current` maps the paths seen this run to their (size, mtime_ns); any other path is checked on disk.
+        """
+        stale = []
+        exists = {}
+        for path, size, mtime_ns in self._conn.execute("SELECT DISTINCT path, size, mtime_ns FROM hashes"):
+            if path in current:
+                if current[path] != (size, mtime_ns):
+                    stale.append((path, size, mtime_ns))
+            else:
+                if path not in exists:
+                    exists[path] = os.path.exists(path)
+                if not exists[path]:
+                    stale.append((path, size, mtime_ns))
+        self._conn.executemany("DELETE FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?", stale)
+        return len(stale)
+
+    def close(self):
+        """Writes new hashes to disk and closes the database."""
+        self._conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)", self._pending)
+        self._pending = []
+        self._conn.commit()
+        self._conn.close()
+
+DIGEST_ALGORITHM = 'blake2b-128' # Cached in HashCache alongside the perceptual hashes, with a hash size of 0
+DIGEST_SAMPLE = 1 << 16 # Bytes read from each end of a file for the cheap first-round digest
+
+def file_digest(src: Path, size: int, sample: bool=False) -> str:
+    """BLAKE2b digest of a file's bytes or, with `sample`, of only its first and last DIGEST_SAMPLE bytes."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(src, 'rb') as f:
+        if sample and size > 2 * DIGEST_SAMPLE:
+            digest.update(f.read(DIGEST_SAMPLE))
+            f.seek(-DIGEST_SAMPLE, os.SEEK_END)
+            digest.update(f.read(DIGEST_SAMPLE))
         else:
-            self.tolerance_label.config(state="disabled")
-            self.tolerance_scale.config(state="disabled")
-            self.tolerance_number_label.config(state="disabled")
-
-    def on_tolerance_change(self, _=None):
-        value = round(self.tolerance_var.get(), 1) # rounds to nearest 0.1
-        self.tolerance_var.set(value)
-        self.tolerance_number_label.config(text=f"{value:.1f}")
-    
-    def on_extension_change(self, *args):
-        self.result_extension_label.config(text=self.exts_combobox.get())
-    
-    def get_values(self) -> Dict[str, Any]:
-        return {
-            'name': self.name_entry.get(),
-            'number': self.number_entry.get(),
-            'extension': self.exts_combobox.get(),
-            'presume_space': self.space_var.get(),
-            'rename_only': self.rename_var.get(),
-            'dimension': self.sort_dims_combobox.get(),
-            'filter_dupes': self.filter_dupes_var.get(),
-            'tolerance': self.tolerance_var.get()
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+CONFIRM_HASHES = ['none', 'phash', 'whash'] # imagehash functions that can double-check borderline dhash matches
+CONFIRM_MAX_DISTANCE = 10 # Bits; unrelated photos sit around 32, and planted near-duplicates at 4 or less
+
+class ConversionJournal:
+    """Append-only JSON Lines record of every output a run produced, kept in the output directory.
+
+    Each line holds a source's identity (path, size, mtime_ns), the options fingerprint, its assigned
+    number, its output file and a status. The last line for a source wins. Lines written under other
+    options, and lines superseded by later ones, are dropped when the journal is opened.
+    """
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries = self.read(path, fingerprint)
+
+        # Compacts the journal before appending to it
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(temp_path, path)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def read(path: Path, fingerprint: str) -> Dict[str, Dict[str, Any]]:
+        """The latest entry for each source written under the fingerprint, without opening the journal for writing."""
+        entries = {}
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError: # A line cut short by a crash
+                        continue
+                    if entry.get('fingerprint') == fingerprint:
+                        entries[entry['source']] = entry
+        return entries
+
+    def next_number(self, default: int) -> int:
+        """The first number no journaled output uses, or the default for a fresh journal."""
+        return max((entry['number'] for entry in self.entries.values()), default=default - 1) + 1
+
+    def is_done(self, source: str, identity: tuple[int, int], output: Path) -> bool:
+        """True if the source was converted from this exact file and its output is still there."""
+        entry = self.entries.get(source)
+        return (
+            entry is not None and entry['status'] == 'done'
+            and (entry['size'], entry['mtime_ns']) == identity
+            and output.name == entry['output'] and output.exists()
+        )
+
+    def record(self, source: str, identity: tuple[int, int], number: int, output: str, status: str):
+        entry = {
+            'source': source, 'size': identity[0], 'mtime_ns': identity[1],
+            'fingerprint': self.fingerprint, 'number': number, 'output': output, 'status': status
         }
-    
-class Main:
-    def __init__(self, root: tk.Tk):
+        with self._lock:
+            self.entries[source] = entry
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush() # Each finished file survives a crash right after it
+
+    def close(self):
+        self._file.close()
+
+class LibraryEntry(NamedTuple):
+    """One image an earlier run converted into the output folder."""
+    output: str # Filename in the output folder
+    source: str # Resolved path of the input it came from
+    size: int
+    mtime_ns: int
+    confirm_hashes: Dict[str, str] # Hex phash/whash, where they were computed
+
+class LibraryIndex:
+    """Persistent index of the analysis dhash of every image converted into an output folder, across runs.
+
+    The hashes are split into four 16-bit bands, and for each band a sorted copy of its values and the
+    matching record order are kept, all as .npy files that are memory-mapped on open. A query probes
+    every band value within radius // 4 bits of the hash (multi-index hashing, as in HammingIndex) with
+    a binary search, so it only reads the records those probes hit. Filenames, source identities and
+    confirm hashes live in SQLite and are fetched only for matches. Entries added during a run become
+    searchable once save() rewrites the arrays.
+    """
+    NUM_BANDS = 4
+    BAND_BITS = 16
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.added = 0
+        self._pending = {} # output -> (id or None, source, size, mtime_ns, hash, confirm hashes)
+        self._conn = None
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._keys = np.zeros((self.NUM_BANDS, 0), dtype=np.uint16)
+        self._order = np.zeros((self.NUM_BANDS, 0), dtype=np.uint32)
+        if (directory / 'library.sqlite').exists():
+            self._connect()
+            self._load_arrays()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _connect(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.directory / 'library.sqlite')
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, output TEXT NOT NULL UNIQUE, source TEXT NOT NULL, "
+            "size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL, confirm TEXT NOT NULL)"
+        )
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'algorithm'").fetchone()
+        if row is None or row[0] != HASH_ALGORITHM: # Hashes from another analysis decode can't be compared, so start over
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('algorithm', ?)", (HASH_ALGORITHM,))
+            self._conn.commit()
+
+    def _load_arrays(self):
+        """Memory-maps the arrays, rebuilding them from the database if a crash left them out of step."""
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        try:
+            hashes = np.load(self.directory / 'hashes.npy', mmap_mode='r')
+            keys = np.load(self.directory / 'bands.npy', mmap_mode='r')
+            order = np.load(self.directory / 'order.npy', mmap_mode='r')
+            if len(hashes) != count or keys.shape != (self.NUM_BANDS, count) or order.shape != keys.shape:
+                raise ValueError("library arrays do not match the database")
+        except (OSError, ValueError):
+            rows = self._conn.execute("SELECT hash FROM entries ORDER BY id")
+            self._write_arrays(np.array([int(hash_hex, 16) for hash_hex, in rows], dtype=np.uint64))
+            return self._load_arrays()
+        self._hashes, self._keys, self._order = hashes, keys, order
+
+    def _write_arrays(self, hashes: np.ndarray):
+        """Writes the hashes with their sorted bands, each file replaced atomically."""
+        keys = np.empty((self.NUM_BANDS, len(hashes)), dtype=np.uint16)
+        order = np.empty((self.NUM_BANDS, len(hashes)), dtype=np.uint32)
+        for band in range(self.NUM_BANDS):
+            values = ((hashes >> np.uint64(band * self.BAND_BITS)) & np.uint64(0xFFFF)).astype(np.uint16)
+            order[band] = np.argsort(values, kind='stable')
+            keys[band] = values[order[band]]
+        self._hashes = self._keys = self._order = None # Unmaps the old files, which Windows can't replace while mapped
+        for name, array in (('hashes', hashes), ('bands', keys), ('order', order)):
+            temp_path = self.directory / f'{name}.tmp.npy'
+            np.save(temp_path, array)
+            os.replace(temp_path, self.directory / f'{name}.npy')
+
+    @staticmethod
+    @functools.cache
+    def _flips(band_radius: int) -> np.ndarray:
+        """Every 16-bit mask with at most band_radius bits set."""
+        values = np.arange(1 << LibraryIndex.BAND_BITS, dtype=np.uint64)
+        return values[_popcount(values) <= band_radius].astype(np.uint16)
+
+    def query(self, hash_value: int, radius: int) -> list[tuple[LibraryEntry, int]]:
+        """Returns every saved entry within the radius of the hash, with its distance."""
+        if not len(self._hashes):
+            return []
+        flips = self._flips(radius // self.NUM_BANDS)
+        candidates = []
+        for band in range(self.NUM_BANDS):
+            probes = flips ^ np.uint16((hash_value >> (band * self.BAND_BITS)) & 0xFFFF)
+            starts = np.searchsorted(self._keys[band], probes, side='left')
+            lengths = np.searchsorted(self._keys[band], probes, side='right') - starts
+            if lengths.any(): # Positions start..end of every probe's run, without a Python loop over probes
+                positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+                candidates.append(self._order[band][positions])
+        if not candidates:
+            return []
+        ids = np.unique(np.concatenate(candidates))
+        distances = _popcount(self._hashes[ids] ^ np.uint64(hash_value))
+        close = {int(i): int(distance) for i, distance in zip(ids, distances) if distance <= radius}
+        if not close:
+            return []
+        rows = self._conn.execute(
+            f"SELECT id, output, source, size, mtime_ns, confirm FROM entries WHERE id IN ({','.join('?' * len(close))})", list(close)
+        )
+        return [(LibraryEntry(output, source, size, mtime_ns, json.loads(confirm)), close[i]) for i, output, source, size, mtime_ns, confirm in rows]
+
+    def add(self, output: str, source: str, size: int, mtime_ns: int, hash_hex: str, confirm_hashes: Optional[Dict[str, str]]=None):
+        """Records an image kept in the output folder, replacing whatever that output file held before."""
+        self._pending[output] = (source, size, mtime_ns, hash_hex, confirm_hashes or {})
+
+    def save(self):
+        """Writes the entries added since the last save and remaps the arrays."""
+        if not self._pending:
+            return
+        if self._conn is None:
+            self._connect()
+        hashes = np.array(self._hashes, dtype=np.uint64) # An in-memory copy to extend
+        appended = []
+        for output, (source, size, mtime_ns, hash_hex, confirm_hashes) in self._pending.items():
+            row = self._conn.execute("SELECT id FROM entries WHERE output = ?", (output,)).fetchone()
+            entry_id = row[0] if row is not None else len(hashes) + len(appended) # Ids are positions in the arrays
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, output, source, size, mtime_ns, hash_hex, json.dumps(confirm_hashes))
+            )
+            if row is not None:
+                hashes[entry_id] = int(hash_hex, 16)
+            else:
+                appended.append(int(hash_hex, 16))
+        self.added += len(self._pending)
+        self._pending = {}
+        self._write_arrays(np.concatenate([hashes, np.array(appended, dtype=np.uint64)]))
+        self._conn.commit() # After the arrays, so a crash in between shows up as a count mismatch on the next open
+        self._load_arrays()
+
+    def close(self):
+        """Saves pending entries and closes the database."""
+        self.save()
+        if self._conn is not None:
+            self._conn.close()
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process on this host is still running; assumed so where that can't be asked safely."""
+    if os.name != 'posix': # os.kill would terminate it on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class WorkQueue:
+    """SQLite queue of plan job numbers that worker processes on one host claim in batches.
+
+    A claim stores the worker's host and pid, so a worker starting up puts back whatever a crashed one
+    on this host had claimed but not finished. Finished jobs stay finished across restarts.
+    """
+    def __init__(self, path: Path, numbers: list[int]):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False) # Transactions are explicit
+        self._lock = threading.Lock() # Jobs finish on the pipeline's callback threads
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (number INTEGER PRIMARY KEY, worker TEXT, finished INTEGER NOT NULL DEFAULT 0)")
+        with self._transaction():
+            self._conn.executemany("INSERT OR IGNORE INTO jobs (number) VALUES (?)", [(number,) for number in numbers])
+            host = socket.gethostname()
+            for worker, in self._conn.execute("SELECT DISTINCT worker FROM jobs WHERE worker IS NOT NULL AND NOT finished").fetchall():
+                worker_host, _, pid = worker.rpartition(':')
+                if worker_host == host and not _process_alive(int(pid)):
+                    self._conn.execute("UPDATE jobs SET worker = NULL WHERE worker = ? AND NOT finished", (worker,))
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE") # Takes the write lock up front, so two claims can't pick the same rows
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def remaining(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE worker IS NULL").fetchone()[0]
+
+    def claim(self, count: int) -> list[int]:
+        """Claims up to count of the lowest unclaimed job numbers, or none once the queue is drained."""
+        with self._transaction():
+            numbers = [number for number, in self._conn.execute("SELECT number FROM jobs WHERE worker IS NULL ORDER BY number LIMIT ?", (count,))]
+            self._conn.executemany("UPDATE jobs SET worker = ? WHERE number = ?", [(self.worker, number) for number in numbers])
+        return numbers
+
+    def finish(self, number: int):
+        with self._transaction():
+            self._conn.execute("UPDATE jobs SET finished = 1 WHERE number = ?", (number,))
+
+    def close(self):
+        self._conn.close()
+
+class Metrics:
+    """Thread-safe stage timers, per-file step latencies and throughput counters for one run.
+
+    Anything interested in progress subscribes a listener, which is called with an event dict from
+    whichever thread produced it. Events are 'log', 'stage_start', 'stage_end' and 'progress'.
+    With a trace path, stages and files are also written as a Chrome trace (viewable in
+    chrome://tracing or Perfetto), or as JSON Lines if the path ends in .jsonl. Files finish out of
+    order across threads and processes, so each file's span goes on the first of a set of 'files' lanes
+    that is free by the time it started, and spans on one track never overlap.
+    """
+    def __init__(self, trace_path: Optional[Path]=None):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.listeners: list[Callable[[Dict[str, Any]], None]] = []
+        self.stage_seconds = {}
+        self.latencies = defaultdict(list) # step -> seconds per file
+        self.progress_stage = None
+        self.progress_total = 0
+        self.progress_done = 0
+        self.progress_bytes = 0
+        self._progress_start = self._origin
+
+        self._trace = None
+        self._trace_jsonl = False
+        self._trace_first = True
+        self._lane_ends = [] # When the last file span on each lane ended
+        if trace_path is not None:
+            self._trace = open(trace_path, 'w', encoding='utf-8')
+            self._trace_jsonl = trace_path.suffix.lower() == '.jsonl'
+            if not self._trace_jsonl:
+                self._trace.write('[\n')
+
+    def _emit(self, event: Dict[str, Any]):
+        for listener in list(self.listeners):
+            listener(event)
+
+    def _write_record(self, record: Dict[str, Any]):
+        with self._lock:
+            prefix = '' if self._trace_jsonl or self._trace_first else ',\n'
+            self._trace_first = False
+            self._trace.write(prefix + json.dumps(record) + ('\n' if self._trace_jsonl else ''))
+
+    def _write_trace(self, name: str, category: str, start: float, duration: float, args: Optional[Dict[str, Any]]=None, lane: Optional[int]=None):
+        """Writes one complete span; start is a perf_counter() reading and duration is in seconds.
+
+        File spans give their lane, which takes the place of the thread in a Chrome trace.
+        """
+        if self._trace is None:
+            return
+        if self._trace_jsonl:
+            record = {'name': name, 'category': category, 'start_s': round(start - self._origin, 6), 'duration_s': round(duration, 6), **(args or {})}
+            if lane is not None:
+                record['lane'] = lane
+        else:
+            record = {
+                'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident() if lane is None else -1 - lane, # Negative, so never a thread id
+                'ts': round((start - self._origin) * 1e6), 'dur': round(duration * 1e6), 'args': args or {}
+            }
+        self._write_record(record)
+
+    def _file_lane(self, start: float, end: float) -> int:
+        """The first lane whose last file span ended by `start`, or a new one; the span is then booked on it."""
+        with self._lock:
+            lane = next((lane for lane, lane_end in enumerate(self._lane_ends) if lane_end <= start), len(self._lane_ends))
+            if lane < len(self._lane_ends):
+                self._lane_ends[lane] = end
+                return lane
+            self._lane_ends.append(end)
+        if not self._trace_jsonl:
+            self._write_record({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': -1 - lane, 'args': {'name': f'files {lane + 1}'}})
+        return lane
+
+    def log(self, message: str):
+        """Prints a progress message and passes it on to listeners."""
+        with self._lock: # Pool threads log too, and print() writes the message and its newline separately
+            print(message)
+        self._emit({'type': 'log', 'message': message})
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times a block of work as a named stage; repeated stages add up."""
+        self._emit({'type': 'stage_start', 'stage': name})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + duration
+            self._write_trace(name, 'stage', start, duration)
+            self._emit({'type': 'stage_end', 'stage': name, 'seconds': duration})
+
+    def begin_progress(self, stage: str, total: int):
+        """Starts counting files for a stage that handles `total` of them."""
+        with self._lock:
+            self.progress_stage = stage
+            self.progress_total = total
+            self.progress_done = 0
+            self.progress_bytes = 0
+            self._progress_start = time.perf_counter()
+        self._emit({'type': 'progress', **self.progress()})
+
+    def extend_progress(self, count: int):
+        """Adds files to the current stage's total, for stages that discover their work as they go."""
+        with self._lock:
+            self.progress_total += count
+
+    def file_done(self, filename: str, num_bytes: int, latencies: Optional[Dict[str, float]]=None):
+        """Counts one finished file and records how long each of its steps took."""
+        latencies = latencies or {}
+        now = time.perf_counter()
+        with self._lock:
+            self.progress_done += 1
+            self.progress_bytes += num_bytes
+            for step, seconds in latencies.items():
+                self.latencies[step].append(seconds)
+        if self._trace is not None:
+            # Timings come back from other threads and processes, so the span ends now and lasts as long as its steps took
+            total = sum(latencies.values())
+            self._write_trace(filename, self.progress_stage or 'file', now - total, total, {'bytes': num_bytes, **{k: round(v, 6) for k, v in latencies.items()}},
+                              self._file_lane(now - total, now))
+        self._emit({'type': 'progress', **self.progress()})
+
+    def progress(self) -> Dict[str, Any]:
+        """Snapshot of the current stage's counters, with rates and an ETA once any file has finished."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._progress_start
+            done, total = self.progress_done, self.progress_total
+            files_per_s = done / elapsed if elapsed > 0 else 0.0
+            return {
+                'stage': self.progress_stage,
+                'done': done,
+                'total': total,
+                'elapsed_s': elapsed,
+                'files_per_s': files_per_s,
+                'bytes_per_s': self.progress_bytes / elapsed if elapsed > 0 else 0.0,
+                'eta_s': (total - done) / files_per_s if files_per_s else None
+            }
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable stage totals and per-step latencies."""
+        lines = [f"\t{stage}: {seconds:.2f}s" for stage, seconds in self.stage_seconds.items()]
+        for step, values in self.latencies.items():
+            ordered = sorted(values)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            lines.append(f"\t{step} per file: mean {sum(values) / len(values) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+        return lines
+
+    def close(self):
+        if self._trace is not None:
+            if not self._trace_jsonl:
+                self._trace.write('\n]\n')
+            self._trace.close()
+            self._trace = None
+
+PLAN_VERSION = 2 # 2 dropped the mode from each job's metadata
+PLAN_OPTIONS = ('extension', 'image_mode', 'rename_only', 'transfer', 'profile', 'lossless', 'raw_preset', 'raw_bits', 'large_image_mp', 'resume', 'check_library') # Options that shape a plan's outputs
+
+class Pipeline:
+    """Scans, dedupes, sorts and converts or renames the images in input_path. Needs no display."""
+    def __init__(self):
         # Housekeeping
-        self.root = root
-        self.root.title("ImageFlow")
-        self.root.geometry("800x450")
         self.input_path = Path('Input')
         self.output_path = Path('Output')
         self.dupes_path = Path('Duplicates')
+        self.cache_path = Path('.imageflow_cache.sqlite')
+        self.trace_path = Path('imageflow_trace.json')
+        self.metrics = Metrics()
+        self.metrics_listeners = []
         self.unsorted_images = []
+        self.scan = {}
+        self.metadata = {}
+        self.hashes = {}
+        self._confirm_hashes = {}
+        self.decode_cache = DecodeCache(0)
+        self.library_index = None
+        self.work_queue = None
+        self.bytes_copied = 0
+        self.journal = None
+        self._identities = {}
+        self._start_number = None
+        self.errors = []
         
-        # Creates widgets
-        top = tk.Frame(root, height=0) # Placeholder
-        self.input_panel = InputPanel(root)
-        self.convert_button = tk.Button(root, text="Convert", command=self.convert_command, width=40, font=('Arial', 12))
-        bottom = tk.Frame(root, height=0) # Placeholder
-        
-        # Packs widgets
-        top.pack(expand=True)
-        self.input_panel.pack(anchor='w')
-        self.convert_button.pack(anchor='center')
-        bottom.pack(expand=True)
-
         # Default variables
         self.default_name = "Image"
         self.default_number = 1
         self.default_extension = 'PNG'
         self.default_presume_space = True
         self.default_rename_only = False
-        self.default_dimension = 'None'
+        self.default_dimension = 'none'
         self.default_filter_dupes = False
         self.default_tolerance = 5.0
+        self.default_confirm_hash = 'none'
+        self.default_check_library = True
+        self.default_workers = os.cpu_count() or 1
+        self.default_memory_limit_mb = 2048
+        self.default_decode_cache_mb = 256
+        self.default_large_image_mp = 100
+        self.default_resume = True
+        self.default_transfer = 'copy'
+        self.default_trace = False
+        self.default_profile = 'balanced'
+        self.default_lossless = False
+        self.default_raw_preset = 'full'
+        self.default_raw_bits = 8
+        self.default_include = ['*']
+        self.default_exclude = ['.*'] # Hidden files and folders, e.g. macOS '._' resource forks on card dumps
+        self.default_recursive = True
+        self.default_sniff = True
+        self.default_watch = False
 
         self.default_num_digits = 1
         self.default_image_mode = 'RGBA'
+        self.matrix_cost_ratio = 32 # Roughly how many NumPy pair comparisons cost as much as one HammingIndex candidate check
+        self.confirm_margin = 2 # dhash matches more than this many bits inside the tolerance are never second-guessed
 
         # Variables
         self.name = self.default_name
@@ -262,6 +1542,27 @@ class Main:
         self.dimension = self.default_dimension
         self.filter_dupes = self.default_filter_dupes
         self.tolerance = self.default_tolerance
+        self.confirm_hash = self.default_confirm_hash
+        self.check_library = self.default_check_library
+        self.workers = self.default_workers
+        self.memory_limit_mb = self.default_memory_limit_mb
+        self.decode_cache_mb = self.default_decode_cache_mb
+        self.large_image_mp = self.default_large_image_mp
+        self.resume = self.default_resume
+        self.transfer = self.default_transfer
+        self.trace = self.default_trace
+        self.profile = self.default_profile
+        self.lossless = self.default_lossless
+        self.raw_preset = self.default_raw_preset
+        self.raw_bits = self.default_raw_bits
+        self.include = self.default_include
+        self.exclude = self.default_exclude
+        self.recursive = self.default_recursive
+        self.sniff = self.default_sniff
+        self.watch = self.default_watch
+        self.io_workers = 4
+        self.watch_settle = 0.3 # Seconds a new file's size and mtime must hold still before it is processed
+        self.watch_poll_interval = 1.0 # Seconds between rescans when inotify is unavailable
 
         self.num_digits = self.default_num_digits
         self.image_mode = self.default_image_mode
@@ -278,6 +1579,24 @@ class Main:
             ('default_dimension', self.default_dimension),
             ('default_filter_dupes', self.default_filter_dupes),
             ('default_tolerance', self.default_tolerance),
+            ('default_confirm_hash', self.default_confirm_hash),
+            ('default_check_library', self.default_check_library),
+            ('default_workers', self.default_workers),
+            ('default_memory_limit_mb', self.default_memory_limit_mb),
+            ('default_decode_cache_mb', self.default_decode_cache_mb),
+            ('default_large_image_mp', self.default_large_image_mp),
+            ('default_resume', self.default_resume),
+            ('default_transfer', self.default_transfer),
+            ('default_trace', self.default_trace),
+            ('default_profile', self.default_profile),
+            ('default_lossless', self.default_lossless),
+            ('default_raw_preset', self.default_raw_preset),
+            ('default_raw_bits', self.default_raw_bits),
+            ('default_include', self.default_include),
+            ('default_exclude', self.default_exclude),
+            ('default_recursive', self.default_recursive),
+            ('default_sniff', self.default_sniff),
+            ('default_watch', self.default_watch),
             ('default_num_digits', self.default_num_digits),
             ('default_image_mode', self.default_image_mode)
         ]
@@ -294,142 +1613,551 @@ class Main:
             ('dimension', self.dimension),
             ('filter_dupes', self.filter_dupes),
             ('tolerance', self.tolerance),
+            ('confirm_hash', self.confirm_hash),
+            ('check_library', self.check_library),
+            ('workers', self.workers),
+            ('memory_limit_mb', self.memory_limit_mb),
+            ('decode_cache_mb', self.decode_cache_mb),
+            ('large_image_mp', self.large_image_mp),
+            ('resume', self.resume),
+            ('transfer', self.transfer),
+            ('trace', self.trace),
+            ('profile', self.profile),
+            ('lossless', self.lossless),
+            ('raw_preset', self.raw_preset),
+            ('raw_bits', self.raw_bits),
+            ('include', self.include),
+            ('exclude', self.exclude),
+            ('recursive', self.recursive),
+            ('sniff', self.sniff),
+            ('watch', self.watch),
             ('num_digits', self.num_digits),
             ('image_mode', self.image_mode)
         ]
         for var_name, value in values:
             print(f"{var_name}: {value} ({type(value).__name__})")
 
-    def _iter_togglables(self) -> list[tk.Misc]:
-        """Helper function that returns all widgets in InputPanel."""
-        return [
-            self.input_panel.name_label,
-            self.input_panel.name_entry,
-            self.input_panel.space_check,
-            self.input_panel.rename_check,
-            self.input_panel.number_label,
-            self.input_panel.number_entry,
-            self.input_panel.sort_dims_label,
-            self.input_panel.sort_dims_combobox,
-            self.input_panel.filter_dupes_check,
-            self.input_panel.tolerance_label,
-            self.input_panel.tolerance_scale,
-            self.input_panel.tolerance_number_label,
-            self.input_panel.exts_label,
-            self.input_panel.exts_combobox,
-            self.input_panel.preview_label,
-            self.input_panel.result_name_label,
-            self.input_panel.result_number_label,
-            self.input_panel.result_extension_label,
-            self.convert_button,
-        ]
-
-    def disable_elements(self):
-        # Snapshots current states for each widget, then disables
-        self._prev_states = {w: w.cget("state") for w in self._iter_togglables()}
-        for w in self._iter_togglables():
-            w.config(state="disabled")
-
-    def restore_elements(self):
-        # Restores each widget's previous state
-        for w, st in getattr(self, "_prev_states", {}).items():
-            w.config(state=st)
-            
-    def convert_command(self):
-        # Parses input values
-        input_values = self.input_panel.get_values()
+    def configure(self, input_values: Dict[str, Any]):
+        """Parses option values shaped like InputPanel.get_values, falling back to the defaults."""
 
-        self.name = str(input_values['name']) if input_values['name'] else self.default_name
-        self.number = int(input_values['number']) if input_values['number'] else self.default_number
-        self.extension = str(input_values['extension']).upper()[1:] if input_values['extension'] else self.default_extension
+        self.name = str(input_values['name']) if input_values.get('name') else self.default_name
+        self.number = int(input_values['number']) if input_values.get('number') else self.default_number
+        self.extension = str(input_values['extension']).upper()[1:] if input_values.get('extension') else self.default_extension
         self.presume_space = bool(input_values['presume_space']) if input_values.get('presume_space') is not None else self.default_presume_space
         self.rename_only = bool(input_values['rename_only']) if input_values.get('rename_only') is not None  else self.default_rename_only
-        self.dimension = str(input_values['dimension']).lower() if input_values['dimension'] else self.default_dimension
+        self.dimension = str(input_values['dimension']).lower() if input_values.get('dimension') else self.default_dimension
         self.filter_dupes = bool(input_values['filter_dupes']) if input_values.get('filter_dupes') is not None else self.default_filter_dupes
         self.tolerance = float(input_values['tolerance']) if input_values.get('tolerance') is not None else self.default_tolerance
+        self.confirm_hash = str(input_values['confirm_hash']).lower() if input_values.get('confirm_hash') else self.default_confirm_hash
+        self.check_library = bool(input_values['check_library']) if input_values.get('check_library') is not None else self.default_check_library
+        self.workers = max(1, int(input_values['workers'])) if input_values.get('workers') else self.default_workers
+        self.memory_limit_mb = max(1, int(input_values['memory_limit'])) if input_values.get('memory_limit') else self.default_memory_limit_mb
+        self.decode_cache_mb = max(0, int(input_values['decode_cache'])) if input_values.get('decode_cache') is not None else self.default_decode_cache_mb
+        self.large_image_mp = max(0, int(input_values['large_image_mp'])) if input_values.get('large_image_mp') is not None else self.default_large_image_mp
+        self.resume = bool(input_values['resume']) if input_values.get('resume') is not None else self.default_resume
+        self.transfer = str(input_values['transfer']).lower() if input_values.get('transfer') else self.default_transfer
+        self.trace = bool(input_values['trace']) if input_values.get('trace') is not None else self.default_trace
         
-        self.num_digits = len(input_values['number']) if input_values['number'] else self.default_num_digits
-        self.image_mode = 'RGBA' if self.extension == 'PNG' else 'RGB' # TO DO: Refer to https://pillow.readthedocs.io/en/latest/handbook/concepts.html#modes and account for every image mode
+        self.num_digits = len(input_values['number']) if input_values.get('number') else self.default_num_digits
+        self.profile = str(input_values['profile']).lower() if input_values.get('profile') else self.default_profile
+        self.lossless = bool(input_values['lossless']) if input_values.get('lossless') is not None else self.default_lossless
+        self.raw_preset = str(input_values['raw_preset']).lower() if input_values.get('raw_preset') else self.default_raw_preset
+        self.raw_bits = int(input_values['raw_bits']) if input_values.get('raw_bits') else self.default_raw_bits
+        self.include = self._parse_globs(input_values['include']) if input_values.get('include') is not None else self.default_include
+        self.exclude = self._parse_globs(input_values['exclude']) if input_values.get('exclude') is not None else self.default_exclude
+        self.recursive = bool(input_values['recursive']) if input_values.get('recursive') is not None else self.default_recursive
+        self.sniff = bool(input_values['sniff']) if input_values.get('sniff') is not None else self.default_sniff
+        self.watch = bool(input_values['watch']) if input_values.get('watch') is not None else self.default_watch
+        self.image_mode = 'RGBA' if self.extension in ALPHA_FORMATS else 'RGB' # TO DO: Refer to https://pillow.readthedocs.io/en/latest/handbook/concepts.html#modes and account for every image mode
+
+    @staticmethod
+    def _parse_globs(value: str | list[str]) -> list[str]:
+        """Splits a comma- or semicolon-separated glob list, as typed into the window, into patterns."""
+        if isinstance(value, str):
+            value = re.split(r'[;,]', value)
+        return [pattern.strip() for pattern in value if pattern.strip()]
+
+    def log(self, message: str):
+        """Reports progress through the current run's metrics, which print it and pass it to listeners."""
+        self.metrics.log(message)
 
-        # Runs the command
-        self.disable_elements()
-        threading.Thread(target=self.run, daemon=True).start()
-    
     def ensure_dirs(self):
         """Verifies that the input, output, and dupes directories exist or creates them if necessary."""
         # Creates input directory
         if not self.input_path.exists():
             self.input_path.mkdir(parents=True)
-            return print(f"Creating a folder named '{self.input_path.name}'.\nPlease move unsorted images into the '{self.input_path.name}' directory.")
+            return self.log(f"Creating a folder named '{self.input_path.name}'.\nPlease move unsorted images into the '{self.input_path.name}' directory.")
         
+        # Gets all the unsorted images in one pass, keeping each file's stat for later stages
+        skip_dirs = [self.output_path, self.dupes_path] # In case either lives inside the input directory
+        self.scan = {entry.path: entry for entry in scan_images(self.input_path, self.include, self.exclude, self.recursive, self.sniff, skip_dirs)}
+        self.unsorted_images = list(self.scan)
+
         # Ensures that images exist in the input directory
-        # TO DO: Replace extensions with a try-except to open the image to prevent errors further down the pipeline
-        extensions = {'.png', '.jpg', '.jpeg', '.arw', '.nef', '.webp', '.txt'}
-        if not any(file.suffix.lower() in extensions for file in self.input_path.iterdir() if file.is_file()):
-            return print(f"There are no images to sort!\nPlease move unsorted images into the '{self.input_path.name}' directory.")
+        if not self.unsorted_images:
+            return self.log(f"There are no images to sort!\nPlease move unsorted images into the '{self.input_path.name}' directory.")
+        self.log(f"Found {len(self.unsorted_images)} images.")
         
-        # Gets a list of all the unsorted images
-        self.unsorted_images = [file.name for file in self.input_path.iterdir() if file.is_file() and file.suffix.lower() in extensions]
-            
         # Creates output directory
         if not self.output_path.exists():
             self.output_path.mkdir(parents=True)
-            print(f"Creating a folder named '{self.output_path.name}'.")
+            self.log(f"Creating a folder named '{self.output_path.name}'.")
         
         # Creates dupes directory
         if not self.dupes_path.exists():
             self.dupes_path.mkdir(parents=True)
-            print(f"Creating a folder named '{self.dupes_path.name}'. Duplicate images will be moved here, if filtering out duplicates is selected.")
+            self.log(f"Creating a folder named '{self.dupes_path.name}'. Duplicate images will be moved here, if filtering out duplicates is selected.")
     
     def _convert(self, source_filename: str, target_filename: str):
         """Helper function to convert one image file format to another."""
-        target_filename = f"{target_filename}{self.number:0{self.num_digits}d}.{self.extension.lower()}"
         src = Path(os.path.join(self.input_path, source_filename))
         dst = Path(os.path.join(self.output_path, target_filename))
-        if src.suffix.lower() in {'.arw', '.nef'}: # Accounts for Sony RAW format
-            with rawpy.imread(src) as raw:
-                rgb = raw.postprocess() # Demosaics and converts to RGB
-            imageio.imsave(dst, rgb)
-        elif src.suffix.lower() in {'.png', '.webp'}: # Accounts for images that can have alpha channels
-            img = Image.open(src)
-            img = ImageOps.exif_transpose(img) # Auto-rotates based on EXIF
-            if img.mode.endswith('A') and self.extension != 'PNG': # Removes the alpha channel from the image
-                background = Image.new("RGB", img.size, (255, 255, 255))
-                background.paste(img, mask=img.getchannel('A'))
-                img = background
-            img = img.convert(self.image_mode)
-            img.save(dst, self.extension)
-        else: # All other native image formats
-            img = Image.open(src)
-            img = ImageOps.exif_transpose(img) # Auto-rotates based on EXIF
-            img = img.convert(self.image_mode)
-            img.save(dst, self.extension)
-        print(f"Converted {source_filename} to {target_filename}")
+        if self._tiled(source_filename):
+            timings = convert_image_tiled(src, dst, self.extension, self.image_mode, self.metadata[source_filename].format, self._save_options())
+        else:
+            timings = convert_image(src, dst, self.extension, self.image_mode, self.metadata[source_filename].format, self._save_options(), self.raw_preset, self.raw_bits)
+        self.metrics.file_done(source_filename, self.metadata[source_filename].size, timings)
+        self.log(f"Converted {source_filename} to {target_filename}")
     
     def _rename(self, source_filename: str, target_filename: str):
         """Helper function to rename an image."""
-        target_filename = f"{target_filename}{self.number:0{self.num_digits}d}{Path(source_filename).suffix}"
         src = Path(os.path.join(self.input_path, source_filename))
         dst = Path(os.path.join(self.output_path, target_filename))
-        shutil.copy2(src, dst)
-        print(f"Renamed {source_filename} to {target_filename}")
+        start = time.perf_counter()
+        method, copied = transfer_file(src, dst, self.transfer)
+        self.bytes_copied += copied
+        self.metrics.file_done(source_filename, copied, {'transfer': time.perf_counter() - start})
+        self.log(f"Renamed {source_filename} to {target_filename} ({method})")
+
+    def _scan_metadata(self):
+        """Reads every input's header once; sorting, duplicate scoring and conversion all use the result."""
+        def read(filename: str) -> ImageMeta:
+            src = Path(os.path.join(self.input_path, filename))
+            try:
+                return read_metadata(src, self.scan[filename].size)
+            except Exception as e:
+                self.log(f"\tCould not read {filename}: {e}")
+                return ImageMeta(self.scan[filename].size, 0, 0, None, 1)
+
+        # Header reads are dominated by I/O latency, so threads overlap them well
+        with ThreadPoolExecutor(max_workers=min(32, self.workers * 4)) as executor:
+            self.metadata = dict(zip(self.unsorted_images, executor.map(read, self.unsorted_images)))
+
+    def _tiled(self, filename: str) -> bool:
+        """Whether an image is large enough to convert in strips, and in a format large-image mode handles."""
+        meta = self.metadata[filename]
+        return (self.large_image_mp > 0 and self.extension in TILED_FORMATS and meta.format not in (None, 'RAW')
+                and meta.width * meta.height >= self.large_image_mp * 1_000_000)
+
+    def _save_options(self) -> Dict[str, Any]:
+        return encoder_options(self.extension, self.profile, self.lossless)
+
+    def _options_fingerprint(self) -> str:
+        """Digest of every option that changes output names or contents; a journal only applies to matching runs."""
+        options = {
+            'name': self.name,
+            'number': self._start_number if self._start_number is not None else self.number,
+            'extension': self.extension,
+            'presume_space': self.presume_space,
+            'rename_only': self.rename_only,
+            'num_digits': self.num_digits,
+            'image_mode': self.image_mode,
+            'profile': self.profile,
+            'lossless': self.lossless,
+            'raw_preset': self.raw_preset,
+            'raw_bits': self.raw_bits
+        }
+        return hashlib.sha1(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _assign_numbers(self, sorted_images: list[str], name: str) -> list[tuple[int, str, str]]:
+        """Assigns every image its output number and target filename up front, in sorted order.
+
+        Images the journal already knows keep their recorded number; new ones continue after the highest one.
+        """
+        known = self.journal.entries if self.journal is not None else {}
+        next_number = self.journal.next_number(self.number) if self.journal is not None else self.number
+        jobs = []
+        for filename in sorted_images:
+            if filename in known:
+                number = known[filename]['number']
+            else:
+                number = next_number
+                next_number += 1
+            suffix = Path(filename).suffix if self.rename_only else f".{self.extension.lower()}"
+            jobs.append((number, filename, f"{name}{number:0{self.num_digits}d}{suffix}"))
+        return jobs
+
+    def _skip_finished(self, jobs: list[tuple[int, str, str]]) -> list[tuple[int, str, str]]:
+        """Drops jobs the journal shows as done from an unchanged source, and remembers each source's identity."""
+        remaining = []
+        for job in jobs:
+            _, source_filename, target_filename = job
+            entry = self.scan[source_filename]
+            self._identities[source_filename] = (entry.size, entry.mtime_ns)
+            if self.journal.is_done(source_filename, self._identities[source_filename], Path(os.path.join(self.output_path, target_filename))):
+                continue
+            remaining.append(job)
+        if len(remaining) < len(jobs):
+            self.log(f"Skipping {len(jobs) - len(remaining)} image(s) already converted by an earlier run.")
+        return remaining
+
+    def _job_finished(self, job: tuple[int, str, str], error: Optional[Exception]=None):
+        """Collects a job's error, if any, and records its outcome in the journal."""
+        number, source_filename, target_filename = job
+        if error is not None:
+            self.errors.append((source_filename, str(error)))
+        if self.journal is not None:
+            self.journal.record(source_filename, self._identities[source_filename], number, target_filename, 'failed' if error else 'done')
+        if error is None and self.library_index is not None and source_filename in self.hashes:
+            confirm_hashes = {self.confirm_hash: str(self._confirm_hashes[source_filename])} if source_filename in self._confirm_hashes else {}
+            self.library_index.add(target_filename, *self._source_identity(source_filename), str(self.hashes[source_filename]), confirm_hashes)
+        if error is None and self.work_queue is not None: # A failed job stays claimed until its worker exits, then goes back in
+            self.work_queue.finish(number)
+
+    def _sort_images(self) -> list[str]:
+        return sorted(self.unsorted_images, key=self.dimension_sort_key if self.dimension != 'none' else self.natural_sort_key)
+
+    def _process(self, jobs: Iterable[tuple[int, str, str]]):
+        # Renaming is I/O-bound, and a single worker gains nothing from a pool
+        if self.rename_only or self.workers <= 1 or (isinstance(jobs, list) and len(jobs) <= 1):
+            self._process_serial(jobs)
+        else:
+            self._process_parallel(jobs)
+
+    def _process_serial(self, jobs: Iterable[tuple[int, str, str]]):
+        """Processes every job one at a time on the current thread, collecting per-file errors."""
+        process_fn = self._rename if self.rename_only else self._convert
+        for job in jobs:
+            _, source_filename, target_filename = job
+            try:
+                process_fn(source_filename, target_filename)
+            except Exception as e:
+                self.log(f"\tError processing {source_filename}: {e}")
+                self._job_finished(job, e)
+            else:
+                self._job_finished(job)
+
+    def _process_parallel(self, jobs: Iterable[tuple[int, str, str]]):
+        """Streams jobs through read, encode and write stages; output names were already fixed by _assign_numbers.
+
+        Reads and writes run on an I/O thread pool and decode/transform/encode on a process pool, so disk
+        and CPU work overlap. Each job reserves its estimated memory before it is read and gives it back
+        once its output is written, which is the backpressure that keeps the pipeline at a flat footprint.
+        Images large enough for strips are converted from file to file inside a worker instead.
+        """
+        budget = MemoryBudget(self.memory_limit_mb * 1024 * 1024)
+        save_options = self._save_options()
+        lock = threading.Lock()
+        finished = threading.Condition(lock)
+        pending = 0
+
+        def finish(job: tuple[int, str, str], cost: int, error: Optional[Exception]=None):
+            nonlocal pending
+            budget.release(cost)
+            with lock:
+                try:
+                    if error is not None:
+                        self.log(f"\tError converting {job[1]}: {error}")
+                    self._job_finished(job, error)
+                except Exception as e: # A failed journal, library or queue write; a done-callback's exception would just be swallowed
+                    self.log(f"\tCould not record {job[1]}: {e}")
+                    self.errors.append((job[1], f"could not record the result: {e}"))
+                finally: # Always, or the wait for pending jobs below never returns
+                    pending -= 1
+                    finished.notify_all()
+
+        def read(src: Path) -> tuple[bytes, float]:
+            start = time.perf_counter()
+            return src.read_bytes(), time.perf_counter() - start
+
+        def write(dst: Path, data: bytes) -> float:
+            start = time.perf_counter()
+            dst.write_bytes(data)
+            return time.perf_counter() - start
+
+        def on_written(future, job: tuple[int, str, str], cost: int, timings: Dict[str, float]):
+            error = future.exception()
+            if error is None:
+                self.metrics.file_done(job[1], self.metadata[job[1]].size, {**timings, 'write': future.result()})
+                self.log(f"Converted {job[1]} to {job[2]}")
+            finish(job, cost, error)
+
+        def on_encoded(future, job: tuple[int, str, str], cost: int, read_time: float):
+            if future.exception() is not None:
+                return finish(job, cost, future.exception())
+            data, timings = future.result()
+            dst = Path(os.path.join(self.output_path, job[2]))
+            try:
+                written = io_pool.submit(write, dst, data)
+            except Exception as e: # Pool shut down underneath us
+                return finish(job, cost, e)
+            written.add_done_callback(lambda f: on_written(f, job, cost, {'read': read_time, **timings}))
+
+        def on_converted(future, job: tuple[int, str, str], cost: int):
+            error = future.exception()
+            if error is None:
+                self.metrics.file_done(job[1], self.metadata[job[1]].size, future.result())
+                self.log(f"Converted {job[1]} to {job[2]}")
+            finish(job, cost, error)
+
+        def on_read(future, job: tuple[int, str, str], cost: int):
+            if future.exception() is not None:
+                return finish(job, cost, future.exception())
+            data, read_time = future.result()
+            try:
+                encoded = cpu_pool.submit(encode_image, data, self.extension, self.image_mode, self.metadata[job[1]].format, save_options, self.raw_preset, self.raw_bits)
+            except Exception as e: # A crashed worker breaks the whole pool
+                return finish(job, cost, e)
+            encoded.add_done_callback(lambda f: on_encoded(f, job, cost, read_time))
+
+        # Forked workers can deadlock in LibRaw's OpenMP threads once the parent has loaded rawpy, so they start fresh then
+        mp_context = multiprocessing.get_context('forkserver') if 'rawpy' in sys.modules and multiprocessing.get_start_method() == 'fork' else None
+        with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool, ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context, initializer=set_pixel_limit, initargs=(self.large_image_mp,)) as cpu_pool:
+            for job in jobs:
+                tiled = self._tiled(job[1])
+                cost = estimate_job_memory(self.metadata[job[1]], tiled)
+                budget.acquire(cost) # Blocks here while the stages downstream are full
+                with lock:
+                    pending += 1
+                src = Path(os.path.join(self.input_path, job[1]))
+                if tiled: # Large images stream from and to disk inside the worker rather than passing through here as bytes
+                    dst = Path(os.path.join(self.output_path, job[2]))
+                    try:
+                        converting = cpu_pool.submit(convert_image_tiled, src, dst, self.extension, self.image_mode, self.metadata[job[1]].format, save_options)
+                    except Exception as e: # A crashed worker breaks the whole pool
+                        finish(job, cost, e)
+                        continue
+                    converting.add_done_callback(lambda f, job=job, cost=cost: on_converted(f, job, cost))
+                    continue
+                reading = io_pool.submit(read, src)
+                reading.add_done_callback(lambda f, job=job, cost=cost: on_read(f, job, cost))
+
+            with lock:
+                while pending:
+                    finished.wait()
+
+    def _similar_pairs(self, hashes: list[tuple[str, imagehash.ImageHash]], radius: int):
+        """Yields every pair of filenames whose hashes are within the radius, with their distance.
+
+        Small radii go through a HammingIndex, which only looks at likely neighbours. When the radius is
+        wide enough that the index would end up checking a large share of all hashes anyway, every pair
+        is compared with the tiled NumPy kernel instead, which is far cheaper per comparison.
+        """
+        filenames = [filename for filename, _ in hashes]
+        hash_values = [hash_to_int(image_hash) for _, image_hash in hashes]
+        if HammingIndex.estimated_query_cost(radius, len(hashes)) * self.matrix_cost_ratio < len(hashes):
+            index = HammingIndex(radius, expected_size=len(hashes))
+            # Each image is matched against the ones indexed before it, so every pair is seen exactly once
+            for filename, hash_value in zip(filenames, hash_values):
+                for match, distance in index.query(hash_value):
+                    yield filename, match, distance
+                index.add(hash_value, filename)
+        else:
+            values = np.array(hash_values, dtype=np.uint64)
+            for i, j in hamming_pairs_matrix(values, radius):
+                distances = _popcount(values[i] ^ values[j])
+                for a, b, distance in zip(i.tolist(), j.tolist(), distances.tolist()):
+                    yield filenames[a], filenames[b], distance
+
+    def _analysis_image(self, filename: str) -> Image.Image:
+        """The reduced decode every hash is computed from, shared through the decode cache."""
+        src = Path(os.path.join(self.input_path, filename))
+        return self.decode_cache.get((filename, 'analysis'), lambda: open_for_analysis(src, self.metadata[filename].format))
+
+    def _confirm_hash_of(self, filename: str) -> imagehash.ImageHash:
+        """The second perceptual hash of an image, from the same reduced decode dhash uses; computed once per run."""
+        import imagehash
+        if filename not in self._confirm_hashes:
+            self._confirm_hashes[filename] = getattr(imagehash, self.confirm_hash)(self._analysis_image(filename), hash_size=HASH_SIZE)
+        return self._confirm_hashes[filename]
+
+    def _confirmed(self, filename1: str, filename2: str, distance: int, radius: int) -> bool:
+        """Double-checks a dhash match near the tolerance with a second hash; clearer matches pass as they are."""
+        if self.confirm_hash == 'none' or distance <= max(radius - self.confirm_margin, 0):
+            return True
+        try:
+            return self._confirm_hash_of(filename1) - self._confirm_hash_of(filename2) <= CONFIRM_MAX_DISTANCE
+        except Exception as e: # Keeps dhash's verdict
+            self.log(f"\tCould not confirm {filename1} and {filename2}: {e}")
+            return True
+
+    def _move_to_dupes(self, filename: str, reason: str=""):
+        """Moves one input image into the dupes directory, mirroring its subfolder."""
+        src = Path(os.path.join(self.input_path, filename))
+        dst = Path(os.path.join(self.dupes_path, filename))
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(src, dst)
+        self.log(f"\tMoved {src} to {dst}{reason}")
 
     def _filter_dupes(self):
         if not self.filter_dupes:
             return
-        
-        # Step 1: hash all images
-        print("Computing image hashes...")
+        self._confirm_hashes = {}
+        with self.metrics.stage('digest'):
+            self._remove_exact_copies()
+        with self.metrics.stage('hash'):
+            hashes = self._hash_images()
+        self.hashes = dict(hashes)
+        with self.metrics.stage('group'):
+            self._group_dupes(hashes)
+        if self.library_index is not None:
+            with self.metrics.stage('library'):
+                self._check_library()
+
+    def _source_identity(self, filename: str) -> tuple[str, int, int]:
+        """(resolved path, size, mtime_ns) of an input, which is how the library tells a file from its earlier conversion."""
+        entry = self.scan[filename]
+        return str(Path(os.path.join(self.input_path, filename)).resolve()), entry.size, entry.mtime_ns
+
+    def _library_match(self, filename: str, image_hash: imagehash.ImageHash) -> Optional[tuple[LibraryEntry, int]]:
+        """The closest image an earlier run kept that this one duplicates, or None.
+
+        Matches are skipped if they came from this very file or if their output has since been deleted.
+        Borderline ones are confirmed against the confirm hash stored with the entry, when it has one.
+        """
+        import imagehash
+        radius = int(self.tolerance)
+        identity = self._source_identity(filename)
+        matches = []
+        for entry, distance in self.library_index.query(hash_to_int(image_hash), radius):
+            if (entry.source, entry.size, entry.mtime_ns) == identity or not (self.output_path / entry.output).exists():
+                continue
+            stored = entry.confirm_hashes.get(self.confirm_hash)
+            if self.confirm_hash != 'none' and distance > max(radius - self.confirm_margin, 0) and stored is not None:
+                if self._confirm_hash_of(filename) - imagehash.hex_to_hash(stored) > CONFIRM_MAX_DISTANCE:
+                    continue
+            matches.append((entry, distance))
+        return min(matches, key=lambda match: match[1], default=None)
+
+    def _check_library(self):
+        """Moves aside every kept image that duplicates one an earlier run converted into the output folder.
+
+        With confirmation on, each image kept here also gets its confirm hash computed now, while its
+        reduced decode is likely still cached, so the library can store it alongside the dhash.
+        """
+        self.log(f"Checking {len(self.unsorted_images)} images against {len(self.library_index)} in the library...")
+        moved = set()
+        for filename in self.unsorted_images:
+            if filename not in self.hashes:
+                continue
+            match = self._library_match(filename, self.hashes[filename])
+            if match is not None:
+                entry, distance = match
+                self._move_to_dupes(filename, f" (within {distance} bits of {entry.output} in the library)")
+                moved.add(filename)
+            elif self.confirm_hash != 'none':
+                try:
+                    self._confirm_hash_of(filename)
+                except Exception as e: # The library entry just goes without one
+                    self.log(f"\tCould not compute the {self.confirm_hash} of {filename}: {e}")
+        self.unsorted_images = [filename for filename in self.unsorted_images if filename not in moved]
+        self.log(f"{len(moved)} images were already in the library.")
+
+    def _remove_exact_copies(self):
+        """Step 0 of duplicate filtering: moves byte-identical copies aside without decoding anything.
+
+        Only files that share a size are read at all. A digest of their first and last 64 KiB splits
+        most of those, and only files that still collide are digested in full (and cached).
+        """
+        by_size = defaultdict(list)
+        for filename in self.unsorted_images:
+            by_size[self.scan[filename].size].append(filename)
+        groups = [group for group in by_size.values() if len(group) > 1]
+        if not groups:
+            return
+        cache = HashCache(self.cache_path, DIGEST_ALGORITHM, 0)
+        root = self.input_path.resolve()
+
+        def digest(filename: str, sample: bool) -> str:
+            entry = self.scan[filename]
+            try:
+                return file_digest(Path(os.path.join(self.input_path, filename)), entry.size, sample)
+            except OSError as e:
+                self.log(f"\tCould not read {filename}: {e}")
+                return filename # Unique, so it matches nothing
+
+        def refine(groups: list[list[str]], sample: bool) -> list[list[str]]:
+            """Splits groups by digest and returns the groups that still have more than one file."""
+            nonlocal num_read
+            keys = {}
+            missing = []
+            for filename in itertools.chain.from_iterable(groups):
+                entry = self.scan[filename]
+                full = not sample or entry.size <= 2 * DIGEST_SAMPLE
+                cached = cache.get(str(root / filename), entry.size, entry.mtime_ns) if full else None
+                if cached is not None:
+                    keys[filename] = cached
+                else:
+                    missing.append(filename)
+            for filename, key in zip(missing, executor.map(digest, missing, itertools.repeat(sample))):
+                entry = self.scan[filename]
+                if key != filename and (not sample or entry.size <= 2 * DIGEST_SAMPLE):
+                    cache.put(str(root / filename), entry.size, entry.mtime_ns, key)
+                keys[filename] = key
+            num_read += len(missing)
+            collided = defaultdict(list)
+            for filename in itertools.chain.from_iterable(groups):
+                collided[(self.scan[filename].size, keys[filename])].append(filename)
+            return [group for group in collided.values() if len(group) > 1]
+
+        num_read = 0
+        with ThreadPoolExecutor(max_workers=min(32, self.workers * 4)) as executor:
+            # Round 1: small files are digested in full, large ones only at both ends
+            groups = refine(groups, sample=True)
+            exact = [group for group in groups if self.scan[group[0]].size <= 2 * DIGEST_SAMPLE]
+            # Round 2: large files whose ends matched are digested in full
+            exact += refine([group for group in groups if self.scan[group[0]].size > 2 * DIGEST_SAMPLE], sample=False)
+        cache.close()
+
+        # Every copy is identical, so the first in natural order is kept
+        moved = set()
+        for group in exact:
+            keep, *copies = sorted(group, key=self.natural_sort_key)
+            for filename in copies:
+                self._move_to_dupes(filename, f" (exact copy of {keep})")
+                moved.add(filename)
+        self.unsorted_images = [filename for filename in self.unsorted_images if filename not in moved]
+        self.log(f"Removed {len(moved)} exact copies ({num_read} files read, none decoded).")
+
+    def _hash_images(self) -> list[tuple[str, imagehash.ImageHash]]:
+        """Step 1 of duplicate filtering: hashes every image, reusing cached hashes of unchanged files."""
+        import imagehash
+        self.log("Computing image hashes...")
+        cache = HashCache(self.cache_path)
+        identities = {}
         hashes = []
+        num_hashed = num_failed = 0
+        root = self.input_path.resolve()
+        self.metrics.begin_progress('hash', len(self.unsorted_images))
         for filename in self.unsorted_images:
-            src = Path(os.path.join(self.input_path, filename))
             try:
-                with Image.open(src) as img:
-                    hashes.append((filename, imagehash.dhash(img)))
+                # Unchanged files are looked up by identity and never decoded
+                stat = self.scan[filename]
+                key = str(root / filename)
+                identities[key] = (stat.size, stat.mtime_ns)
+                hash_hex = cache.get(key, stat.size, stat.mtime_ns)
+                if hash_hex is not None:
+                    hashes.append((filename, imagehash.hex_to_hash(hash_hex)))
+                    self.metrics.file_done(filename, 0)
+                    continue
+                start = time.perf_counter()
+                image_hash = imagehash.dhash(self._analysis_image(filename), hash_size=HASH_SIZE)
+                cache.put(key, stat.size, stat.mtime_ns, str(image_hash))
+                hashes.append((filename, image_hash))
+                num_hashed += 1
+                self.metrics.file_done(filename, stat.size, {'hash': time.perf_counter() - start})
             except Exception as e:
-                print(f"\tError hashing {filename}: {e}")
-        print(f"Processed {len(hashes)} images.")
+                self.log(f"\tError hashing {filename}: {e}")
+                num_failed += 1
+        pruned = cache.prune(identities)
+        cache.close()
+        # Misses include files that failed to decode, so only successful hashes are counted here
+        failed = f", {num_failed} could not be hashed" if num_failed else ""
+        self.log(f"Processed {len(hashes)} images ({cache.hits} cached, {num_hashed} hashed{failed}, {pruned} stale cache entries removed).")
+        return hashes
 
+    def _group_dupes(self, hashes: list[tuple[str, imagehash.ImageHash]]):
+        """Steps 2-5 of duplicate filtering: groups similar hashes and moves all but the best of each group."""
         # Step 2: Union-find setup
         # Initially, each filename is is a parent of itself and has a rank/height of 0; disjoint sets
         parent = {filename: filename for filename, _ in hashes}
@@ -454,9 +2182,20 @@ class Main:
                 rank[ra] += 1
         
         # Step 3: Build edges by tolerance, union into components
-        for (filename1, hash1), (filename2, hash2) in itertools.combinations(hashes, 2):
-            if hash1 - hash2 <= self.tolerance:
+        radius = int(self.tolerance) # Hamming distances are whole numbers, so "<= 5.7" is "<= 5"
+        rejected = 0
+        pairs = list(self._similar_pairs(hashes, radius))
+        if self.confirm_hash != 'none':
+            # The decode cache is LRU, so confirming the most recently hashed pairs first reuses the most decodes
+            order = {filename: i for i, (filename, _) in enumerate(hashes)}
+            pairs.sort(key=lambda pair: -max(order[pair[0]], order[pair[1]]))
+        for filename1, filename2, distance in pairs:
+            if self._confirmed(filename1, filename2, distance, radius):
                 union(filename1, filename2)
+            else:
+                rejected += 1
+        if rejected:
+            self.log(f"{self.confirm_hash} rejected {rejected} borderline match(es).")
         
         # Step 4: Collect components
         groups = defaultdict(list)
@@ -465,16 +2204,12 @@ class Main:
         
         # Step 5: Choose the best candidate to keep
         def score(filename):
-            src = Path(os.path.join(self.input_path, filename))
-            try:
-                with Image.open(src) as img:
-                    width, height = img.size
-            except Exception:
-                width, height = 0, 0
-            return (src.stat().st_size, width * height)
+            meta = self.metadata[filename]
+            return (meta.size, meta.width * meta.height)
         
-        print("Moving duplicate images...")
+        self.log("Moving duplicate images...")
         kept = []
+        moved = set()
         for _, files, in groups.items():
             # A disjoint set by itself; no similar images to this image
             if len(files) == 1:
@@ -487,28 +2222,359 @@ class Main:
             for filename in files:
                 if filename == keep:
                     continue
-                self.unsorted_images.remove(filename)
-                src = Path(os.path.join(self.input_path, filename))
-                dst = Path(os.path.join(self.dupes_path, filename))
-                shutil.move(src, dst)
-                print(f"\tMoved {src} to {dst}")
-        print(f"Kept {len(kept)} images.")
+                self._move_to_dupes(filename)
+                moved.add(filename)
+        self.unsorted_images = [filename for filename in self.unsorted_images if filename not in moved]
+        self.log(f"Kept {len(kept)} images.")
         
-    def run(self):
-        self.ensure_dirs()
+    def run(self, stop: Optional[threading.Event]=None):
+        """Processes the input folder once, then, in watch mode, keeps processing new files until stop is set."""
+        self._start_metrics()
+        self._start_number = self.number # The batch advances self.number, but the watch phase must keep its journal's fingerprint
+        watcher = None
+        self.library_index = LibraryIndex(self.output_path / '.imageflow_library') if self.filter_dupes and self.check_library else None
+        try:
+            if self.watch: # Started before the batch so nothing landing during it is missed
+                self.input_path.mkdir(parents=True, exist_ok=True)
+                watcher = FolderWatcher(self.input_path, self.recursive, self.watch_settle, self.watch_poll_interval, [self.output_path, self.dupes_path])
+            self._run_stages()
+            if watcher is not None:
+                self._watch_stages(watcher, stop or threading.Event())
+        finally:
+            if watcher is not None:
+                watcher.close()
+            if self.library_index is not None:
+                self.library_index.close()
+            self.metrics.close()
+
+    def _start_metrics(self):
+        set_pixel_limit(self.large_image_mp) # Every run, plan and verify starts here, before any image is opened
+        self.metrics = Metrics(self.trace_path if self.trace else None)
+        self.metrics.listeners.extend(self.metrics_listeners)
+
+    def _run_stages(self):
+        jobs = self._prepare_jobs()
+        if self.journal is not None:
+            jobs = self._skip_finished(jobs)
+
+        stage = 'rename' if self.rename_only else 'convert'
+        self.metrics.begin_progress(stage, len(jobs))
+        with self.metrics.stage(stage):
+            self._process(jobs)
+        self.number += len(jobs)
+        if self.journal is not None:
+            self.journal.close()
+        if self.library_index is not None:
+            self.library_index.save()
+            self.log(f"The library now indexes {len(self.library_index)} images ({self.library_index.added} added).")
+        self._report()
+
+    def _prepare_jobs(self) -> list[tuple[int, str, str]]:
+        """Scans, dedupes, sorts and numbers the input, with the journal of earlier runs open if resuming."""
+        self.errors = []
+        self.bytes_copied = 0
+        self.decode_cache = DecodeCache(self.decode_cache_mb * 1024 * 1024)
+        with self.metrics.stage('scan'):
+            self.ensure_dirs()
+        self.metadata = {}
+        if self.filter_dupes or self.dimension != 'none' or not self.rename_only: # Plain renaming never looks inside the files
+            with self.metrics.stage('metadata'):
+                self._scan_metadata()
         self._filter_dupes()
+        if not self.watch: # Conversion decodes at full size, so the reduced decodes are only worth keeping for watch mode
+            self.decode_cache.clear()
+
+        # Picks up the journal of earlier runs with the same options, if resuming
+        self.journal = None
+        self._identities = {}
+        if self.resume and self.output_path.exists():
+            self.journal = ConversionJournal(self.output_path / '.imageflow_journal.jsonl', self._options_fingerprint())
 
         my_name = f"{self.name} " if self.presume_space else self.name
-        sorted_images = sorted(self.unsorted_images, key=self.dimension_sort_key if self.dimension != 'none' else self.natural_sort_key)
+        with self.metrics.stage('sort'):
+            return self._assign_numbers(self._sort_images(), my_name)
 
-        for filename in sorted_images:
-            process_fn = self._rename if self.rename_only else self._convert
-            process_fn(filename, my_name)
-            self.number += 1
+    def _report(self):
+        if self.rename_only:
+            self.log(f"Copied {self.bytes_copied:,} bytes while renaming.")
+        if self.errors:
+            self.log(f"{len(self.errors)} image(s) failed:")
+            for filename, error in self.errors:
+                self.log(f"\t{filename}: {error}")
+        self.log("Timings:")
+        for line in self.metrics.summary_lines():
+            self.log(line)
+        if self.decode_cache.hits + self.decode_cache.misses:
+            self.log(f"Decode cache: {self.decode_cache.summary()}")
+        self.log("All done!\n")
+
+    @staticmethod
+    def _plan_files(plan_path: Path) -> tuple[Path, Path]:
+        """The folder of per-worker completion records and the work queue database that go with a plan."""
+        return plan_path.with_name(plan_path.stem + '.records'), plan_path.with_name(plan_path.stem + '.queue.sqlite')
+
+    def write_plan(self, plan_path: Path):
+        """Scans, dedupes, sorts and numbers the input once and writes every job to a plan file.
+
+        Workers sharing the folders then convert their part of it with run_plan, and verify_plan checks
+        the result, so any number of them produce exactly what one run would have.
+        """
+        self._start_metrics()
+        self._start_number = self.number
+        self.library_index = LibraryIndex(self.output_path / '.imageflow_library') if self.filter_dupes and self.check_library else None
+        try:
+            jobs = self._prepare_jobs()
+            plan = {
+                'version': PLAN_VERSION,
+                'fingerprint': self._options_fingerprint(),
+                'input': str(self.input_path.resolve()),
+                'output': str(self.output_path.resolve()),
+                'dupes': str(self.dupes_path.resolve()),
+                'options': {name: getattr(self, name) for name in PLAN_OPTIONS},
+                'jobs': [self._plan_job(job) for job in jobs]
+            }
+            if self.journal is not None:
+                self.journal.close()
+
+            # Records and claims of an earlier plan under the same name no longer apply
+            records_dir, queue_path = self._plan_files(plan_path)
+            shutil.rmtree(records_dir, ignore_errors=True)
+            queue_path.unlink(missing_ok=True)
+            temp_path = plan_path.with_name(plan_path.name + '.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(plan, f, indent=1)
+            os.replace(temp_path, plan_path)
+
+            done = sum(job['done'] for job in plan['jobs'])
+            self.log(f"Planned {len(jobs)} images ({done} already converted) in {plan_path}.")
+        finally:
+            if self.library_index is not None:
+                self.library_index.close()
+            self.metrics.close()
+
+    def _plan_job(self, job: tuple[int, str, str]) -> Dict[str, Any]:
+        """One job of a plan, with everything a worker needs to convert it without scanning or hashing."""
+        number, source_filename, target_filename = job
+        path, size, mtime_ns = self._source_identity(source_filename)
+        meta = self.metadata.get(source_filename)
+        done = self.journal is not None and self.journal.is_done(source_filename, (size, mtime_ns), self.output_path / target_filename)
+        return {
+            'number': number, 'source': source_filename, 'target': target_filename,
+            'path': path, 'size': size, 'mtime_ns': mtime_ns,
+            'meta': list(meta) if meta is not None else None,
+            'hash': str(self.hashes[source_filename]) if source_filename in self.hashes else None,
+            'confirm': {self.confirm_hash: str(self._confirm_hashes[source_filename])} if source_filename in self._confirm_hashes else {},
+            'done': done
+        }
+
+    def _load_plan(self, plan_path: Path) -> Dict[str, Any]:
+        """Reads a plan and takes on its folders and output options; per-machine options stay as configured."""
+        with open(plan_path, encoding='utf-8') as f:
+            plan = json.load(f)
+        if plan.get('version') != PLAN_VERSION:
+            raise ValueError(f"{plan_path} is not a plan this version can read")
+        self.input_path, self.output_path, self.dupes_path = Path(plan['input']), Path(plan['output']), Path(plan['dupes'])
+        for name, value in plan['options'].items():
+            setattr(self, name, value)
+        self.metadata = {job['source']: ImageMeta(*job['meta']) for job in plan['jobs'] if job['meta'] is not None}
+        self._identities = {job['source']: (job['size'], job['mtime_ns']) for job in plan['jobs']}
+        return plan
+
+    def run_plan(self, plan_path: Path, shard: tuple[int, int]=(1, 1), queue: bool=False):
+        """Converts this worker's part of a plan: every n-th job from the k-th for shard (k, n), or else
+        jobs claimed from a work queue until it runs dry.
+
+        Each worker records what it finished in a journal of its own beside the plan. The queue is a
+        SQLite database, which is only safe to share between processes on one host.
+        """
+        plan = self._load_plan(plan_path)
+        self._start_metrics()
+        self.errors = []
+        self.bytes_copied = 0
+        self.decode_cache = DecodeCache(0)
+        self.library_index = None # verify_plan indexes the whole plan once it is complete
+        records_dir, queue_path = self._plan_files(plan_path)
+        records_dir.mkdir(exist_ok=True)
+        worker = f"queue-{socket.gethostname()}-{os.getpid()}" if queue else f"shard-{shard[0]}-of-{shard[1]}"
+        self.journal = ConversionJournal(records_dir / f'{worker}.jsonl', plan['fingerprint'])
+        jobs = {job['number']: (job['number'], job['source'], job['target']) for job in plan['jobs'] if not job['done']}
+        stage = 'rename' if self.rename_only else 'convert'
+        try:
+            if queue:
+                self.work_queue = WorkQueue(queue_path, list(jobs))
+                self.log(f"Taking jobs from the queue of {len(plan['jobs'])} as {self.work_queue.worker}.")
+                self.metrics.begin_progress(stage, self.work_queue.remaining())
+                with self.metrics.stage(stage):
+                    self._process(self._claimed_jobs(jobs))
+            else:
+                k, n = shard
+                mine = [jobs[job['number']] for job in plan['jobs'][k - 1::n] if job['number'] in jobs]
+                mine = [job for job in mine if not self.journal.is_done(job[1], self._identities[job[1]], self.output_path / job[2])]
+                self.log(f"Shard {k} of {n} has {len(mine)} of {len(plan['jobs'])} images left to convert.")
+                self.metrics.begin_progress(stage, len(mine))
+                with self.metrics.stage(stage):
+                    self._process(mine)
+            self._report()
+        finally:
+            self.journal.close()
+            if self.work_queue is not None:
+                self.work_queue.close()
+                self.work_queue = None
+            self.metrics.close()
+
+    def _claimed_jobs(self, jobs: Dict[int, tuple[int, str, str]]) -> Iterator[tuple[int, str, str]]:
+        """Claims queued jobs a few at a time as the pipeline asks for them, so no worker hoards the tail."""
+        while numbers := self.work_queue.claim(self.workers):
+            yield from (jobs[number] for number in numbers)
 
-        print("All done!\n")
+    def verify_plan(self, plan_path: Path) -> bool:
+        """Checks that every numbered output of a plan is present and recorded as finished.
 
-        self.root.after(0, self.restore_elements)
+        Once it is complete, the workers' records are folded into the output folder's journal and its
+        images into the library, as one run converting the whole plan would have left them.
+        """
+        plan = self._load_plan(plan_path)
+        self._start_metrics()
+        try:
+            records = {}
+            records_dir, _ = self._plan_files(plan_path)
+            for path in sorted(records_dir.glob('*.jsonl')):
+                for source, entry in ConversionJournal.read(path, plan['fingerprint']).items():
+                    if source not in records or entry['status'] == 'done': # One worker's success outranks another's failure
+                        records[source] = entry
+
+            missing = []
+            for job in plan['jobs']:
+                entry = records.get(job['source'])
+                recorded = job['done'] or (
+                    entry is not None and entry['status'] == 'done' and entry['number'] == job['number']
+                    and (entry['size'], entry['mtime_ns']) == (job['size'], job['mtime_ns'])
+                )
+                if not recorded or not (self.output_path / job['target']).exists():
+                    missing.append(job['number'])
+                    if entry is not None and entry['status'] == 'failed':
+                        self.log(f"\t{job['source']} failed")
+            if missing:
+                self.log(f"{len(missing)} of {len(plan['jobs'])} planned images are missing: {self._number_ranges(missing)}")
+                return False
+            self.log(f"All {len(plan['jobs'])} planned images are there, numbered {self._number_ranges([job['number'] for job in plan['jobs']]) or 'nothing'}.")
+
+            new_jobs = [job for job in plan['jobs'] if not job['done']]
+            if self.resume:
+                journal = ConversionJournal(self.output_path / '.imageflow_journal.jsonl', plan['fingerprint'])
+                for job in new_jobs:
+                    journal.record(job['source'], (job['size'], job['mtime_ns']), job['number'], job['target'], 'done')
+                journal.close()
+            if self.check_library and any(job['hash'] is not None for job in new_jobs):
+                library = LibraryIndex(self.output_path / '.imageflow_library')
+                for job in new_jobs:
+                    if job['hash'] is not None:
+                        library.add(job['target'], job['path'], job['size'], job['mtime_ns'], job['hash'], job['confirm'])
+                library.close()
+                self.log(f"The library now indexes {len(library)} images ({library.added} added).")
+            return True
+        finally:
+            self.metrics.close()
+
+    @staticmethod
+    def _number_ranges(numbers: list[int]) -> str:
+        """Collapses numbers into runs for reporting, e.g. '1-4, 7, 9-10'."""
+        runs = []
+        for number in sorted(numbers):
+            if runs and number == runs[-1][1] + 1:
+                runs[-1][1] = number
+            else:
+                runs.append([number, number])
+        return ', '.join(str(first) if first == last else f"{first}-{last}" for first, last in runs)
+
+    def _watch_stages(self, watcher: FolderWatcher, stop: threading.Event):
+        """Converts each new file as soon as it settles, checking it against an index of the hashes kept so far."""
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.dupes_path.mkdir(parents=True, exist_ok=True)
+        self.journal = ConversionJournal(self.output_path / '.imageflow_journal.jsonl', self._options_fingerprint()) if self.resume else None
+        self._next_number = self.journal.next_number(self.number) if self.journal is not None else self.number
+
+        # Only the images kept by the batch are indexed, so each new file costs one query instead of a regrouping
+        index, cache = None, None
+        if self.filter_dupes:
+            kept = [(filename, self.hashes[filename]) for filename in self.unsorted_images if filename in self.hashes]
+            index = HammingIndex(int(self.tolerance), expected_size=max(4 * len(kept), 1024))
+            for filename, image_hash in kept:
+                index.add(hash_to_int(image_hash), filename)
+            cache = HashCache(self.cache_path)
+
+        self.metrics.begin_progress('watch', 0)
+        self.log(f"Watching '{self.input_path}' for new images ({watcher.mode}, {len(index) if index is not None else 0} hashes indexed)...")
+        try:
+            with self.metrics.stage('watch'):
+                while not stop.is_set():
+                    for path, landed in watcher.poll():
+                        relative = os.path.relpath(path, self.input_path).replace(os.sep, '/')
+                        entry = scan_file(self.input_path, relative, self.include, self.exclude, self.sniff)
+                        known = self.scan.get(relative)
+                        if entry is None or known is not None and (known.size, known.mtime_ns) == (entry.size, entry.mtime_ns):
+                            continue # Not an image, filtered out, or already handled
+                        self._watch_file(entry, landed, index, cache)
+        except KeyboardInterrupt: # Ctrl+C ends a headless watch
+            pass
+        finally:
+            if cache is not None:
+                cache.close()
+            if self.journal is not None:
+                self.journal.close()
+        self.log("Stopped watching.")
+
+    def _watch_file(self, entry: ScanEntry, landed: float, index: Optional[HammingIndex], cache: Optional[HashCache]):
+        """Dedupes one newly settled file against the index, then converts or renames it with the next number."""
+        import imagehash
+        filename = entry.path
+        src = Path(os.path.join(self.input_path, filename))
+        self.scan[filename] = entry
+        try:
+            self.metadata[filename] = read_metadata(src, entry.size)
+            if index is not None:
+                self.decode_cache.discard(filename) # The file may have been rewritten since it was cached
+                image_hash = imagehash.dhash(self._analysis_image(filename), hash_size=HASH_SIZE)
+                cache.put(str(src.resolve()), entry.size, entry.mtime_ns, str(image_hash))
+                radius = int(self.tolerance)
+                matches = [
+                    (match, distance) for match, distance in index.query(hash_to_int(image_hash))
+                    if match != filename and self._confirmed(filename, match, distance, radius)
+                ]
+                if matches:
+                    # What is already numbered stays put, so a later near-duplicate always goes to the dupes folder
+                    original, distance = min(matches, key=lambda match: match[1])
+                    self._confirm_hashes.pop(filename, None)
+                    self._move_to_dupes(filename, f" (within {distance} bits of {original})")
+                    return
+                library_match = self._library_match(filename, image_hash) if self.library_index is not None else None
+                if library_match is not None:
+                    entry, distance = library_match
+                    self._confirm_hashes.pop(filename, None)
+                    self._move_to_dupes(filename, f" (within {distance} bits of {entry.output} in the library)")
+                    return
+                if filename not in self.hashes:
+                    index.add(hash_to_int(image_hash), filename)
+                self.hashes[filename] = image_hash
+        except Exception as e:
+            self.log(f"\tError reading {filename}: {e}")
+            self.errors.append((filename, str(e)))
+            return
+
+        # A file rewritten in place keeps the number it was given the first time
+        known = self.journal.entries.get(filename) if self.journal is not None else None
+        if known is not None:
+            number = known['number']
+        else:
+            number = self._next_number
+            self._next_number += 1
+        my_name = f"{self.name} " if self.presume_space else self.name
+        suffix = Path(filename).suffix if self.rename_only else f".{self.extension.lower()}"
+        job = (number, filename, f"{my_name}{number:0{self.num_digits}d}{suffix}")
+        self._identities[filename] = (entry.size, entry.mtime_ns)
+        self.metrics.extend_progress(1)
+        self._process_serial([job])
+        self.log(f"\t{time.perf_counter() - landed:.2f}s from landing to output")
 
     # Sorting algorithm for numbers (1 to 1, 2 to 2, etc... instead of 1 to 1, 10 to 2, etc)
     def natural_sort_key(self, s: str):
@@ -517,14 +2583,127 @@ class Main:
     
     # Sorting algorithm for dimensions (prioritizes width or height)
     def dimension_sort_key(self, filename: str):
-        src = Path(os.path.join(self.input_path, filename))
-        with Image.open(src) as img:
-            width, height = img.size
-            if self.dimension == 'height':
-                return (-height, -width, self.natural_sort_key(filename))
-            return (-width, -height, self.natural_sort_key(filename))
+        width, height = self.metadata[filename].upright_size # As the image is displayed, so rotated photos sort by what is seen
+        if self.dimension == 'height':
+            return (-height, -width, self.natural_sort_key(filename))
+        return (-width, -height, self.natural_sort_key(filename))
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    """Parses the command line, which takes the same options as the window."""
+    parser = argparse.ArgumentParser(description="Renames, dedupes and converts the images in a folder. Without arguments, opens the window.")
+    parser.add_argument('--input', type=Path, default=Path('Input'), help="folder of unsorted images (default: Input)")
+    parser.add_argument('--output', type=Path, default=Path('Output'), help="folder for the results (default: Output)")
+    parser.add_argument('--dupes', type=Path, default=Path('Duplicates'), help="folder duplicates are moved to (default: Duplicates)")
+    parser.add_argument('--cache', type=Path, default=Path('.imageflow_cache.sqlite'), help="hash and digest cache database (default: .imageflow_cache.sqlite)")
+    parser.add_argument('--name', help="file name prefix (default: Image)")
+    parser.add_argument('--number', help="starting number; leading zeros set the padding (default: 1)")
+    parser.add_argument('--presume-space', action=argparse.BooleanOptionalAction, default=None, help="put a space between name and number (default: on)")
+    parser.add_argument('--rename-only', action=argparse.BooleanOptionalAction, default=None, help="keep the original format and only rename")
+    parser.add_argument('--transfer', choices=[strategy.capitalize() for strategy in TRANSFER_STRATEGIES], type=str.capitalize, help="how rename-only places files (default: Copy)")
+    parser.add_argument('--dimension', choices=["None", "Width", "Height"], type=str.capitalize, help="sort by the largest width or height first")
+    parser.add_argument('--filter-dupes', action=argparse.BooleanOptionalAction, default=None, help="move near-duplicates out before numbering")
+    parser.add_argument('--tolerance', type=float, help="duplicate tolerance in differing hash bits (default: 5)")
+    parser.add_argument('--confirm-hash', choices=CONFIRM_HASHES, type=str.lower, help="second hash that must agree on matches near the tolerance (default: none)")
+    parser.add_argument('--library', dest='check_library', action=argparse.BooleanOptionalAction, default=None, help="also move aside images that match anything earlier runs converted into the output folder (default: on)")
+    parser.add_argument('--extension', choices=output_extensions(), type=lambda value: '.' + value.lower().lstrip('.'), help="output format (default: .png)")
+    parser.add_argument('--profile', choices=[profile.capitalize() for profile in ENCODER_PROFILES], type=str.capitalize, help="encoder profile (default: Balanced)")
+    parser.add_argument('--lossless', action=argparse.BooleanOptionalAction, default=None, help="write lossless WebP")
+    parser.add_argument('--raw-preset', choices=[preset.capitalize() for preset in RAW_PRESETS], type=str.capitalize, help="how RAW files are developed: Full, Fast (bilinear), Half (half size) or Preview (embedded JPEG when large enough) (default: Full)")
+    parser.add_argument('--raw-bits', type=int, choices=RAW_BITS, help="bits per channel RAW files are developed to; 16 only applies to PNG output (default: 8)")
+    parser.add_argument('--workers', type=int, help="conversion processes (default: one per CPU)")
+    parser.add_argument('--memory-limit', type=int, help="MB of decoded images in flight at once (default: 2048)")
+    parser.add_argument('--decode-cache', type=int, help="MB of decoded images kept for reuse between hashing stages (default: 256)")
+    parser.add_argument('--large-image-mp', type=int, help="convert PNG/JPEG output in strips from this many megapixels up, 0 to never and to keep Pillow's 179 MP safety limit (default: 100)")
+    parser.add_argument('--resume', action=argparse.BooleanOptionalAction, default=None, help="skip images an earlier run already finished (default: on)")
+    parser.add_argument('--trace', action=argparse.BooleanOptionalAction, default=None, help="write a timing trace of the run")
+    parser.add_argument('--trace-file', type=Path, default=Path('imageflow_trace.json'), help="where --trace writes, as JSON Lines if it ends in .jsonl (default: imageflow_trace.json)")
+    parser.add_argument('--include', action='append', help="glob of files to take, repeatable (default: *)")
+    parser.add_argument('--exclude', action='append', help="glob of files or folders to skip, repeatable (default: .*)")
+    parser.add_argument('--recursive', action=argparse.BooleanOptionalAction, default=None, help="scan subfolders (default: on)")
+    parser.add_argument('--sniff', action=argparse.BooleanOptionalAction, default=None, help="recognise images by content rather than suffix (default: on)")
+    parser.add_argument('--watch', action=argparse.BooleanOptionalAction, default=None, help="after the first pass, keep converting new files until Ctrl+C")
+    plans = parser.add_mutually_exclusive_group()
+    plans.add_argument('--write-plan', type=Path, metavar='PLAN', help="scan, dedupe, sort and number the input once, then write the jobs to PLAN for workers to share")
+    plans.add_argument('--run-plan', type=Path, metavar='PLAN', help="convert the jobs in PLAN, or this worker's part of them with --shard or --queue")
+    plans.add_argument('--verify-plan', type=Path, metavar='PLAN', help="check that every output in PLAN is there, then record them in the output's journal and library")
+    workers = parser.add_mutually_exclusive_group()
+    workers.add_argument('--shard', metavar='K/N', help="with --run-plan, convert every N-th job starting from the K-th (K from 1 to N)")
+    workers.add_argument('--queue', action='store_true', help="with --run-plan, claim jobs from a queue shared by the workers on this host")
+    args = parser.parse_args(argv)
+    if args.number is not None and not args.number.isdigit():
+        parser.error("--number must be a non-negative whole number")
+    if (args.shard or args.queue) and not args.run_plan:
+        parser.error("--shard and --queue need --run-plan")
+    if args.shard is not None:
+        k, _, n = args.shard.partition('/')
+        if not (k.isdigit() and n.isdigit() and 1 <= int(k) <= int(n)):
+            parser.error("--shard must look like K/N with 1 <= K <= N")
+        args.shard = (int(k), int(n))
+    plan_path = args.run_plan or args.verify_plan
+    if plan_path is not None and not plan_path.is_file():
+        parser.error(f"there is no plan at {plan_path}")
+    if args.watch and (args.write_plan or plan_path):
+        parser.error("--watch can't be combined with a plan")
+    return args
+
+def cli_values(args: argparse.Namespace) -> Dict[str, Any]:
+    """Converts parsed arguments to the values InputPanel.get_values would return."""
+    return {
+        'name': args.name,
+        'number': args.number,
+        'extension': args.extension,
+        'presume_space': args.presume_space,
+        'rename_only': args.rename_only,
+        'dimension': args.dimension,
+        'filter_dupes': args.filter_dupes,
+        'tolerance': args.tolerance,
+        'confirm_hash': args.confirm_hash,
+        'check_library': args.check_library,
+        'workers': args.workers,
+        'memory_limit': args.memory_limit,
+        'decode_cache': args.decode_cache,
+        'large_image_mp': args.large_image_mp,
+        'resume': args.resume,
+        'transfer': args.transfer,
+        'trace': args.trace,
+        'profile': args.profile,
+        'lossless': args.lossless,
+        'raw_preset': args.raw_preset,
+        'raw_bits': args.raw_bits,
+        'include': args.include,
+        'exclude': args.exclude,
+        'recursive': args.recursive,
+        'sniff': args.sniff,
+        'watch': args.watch
+    }
+
+def main(argv: Optional[list[str]]=None) -> int:
+    """Runs the pipeline headlessly when given arguments, otherwise opens the window."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        # The window lives in gui.py and is imported only here, so the command line also runs on Python
+        # builds without Tk, such as slim container images
+        from gui import open_window
+        open_window()
+        return 0
+
+    args = parse_args(argv)
+    pipeline = Pipeline()
+    pipeline.input_path = args.input
+    pipeline.output_path = args.output
+    pipeline.dupes_path = args.dupes
+    pipeline.cache_path = args.cache
+    pipeline.trace_path = args.trace_file
+    pipeline.configure(cli_values(args))
+    if args.write_plan:
+        pipeline.write_plan(args.write_plan)
+    elif args.run_plan:
+        pipeline.run_plan(args.run_plan, args.shard or (1, 1), args.queue)
+    elif args.verify_plan:
+        return 0 if pipeline.verify_plan(args.verify_plan) else 1
+    else:
+        pipeline.run()
+    return 1 if pipeline.errors else 0
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = Main(root)
-    root.mainloop()
+    sys.exit(main())